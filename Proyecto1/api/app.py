@@ -1,12 +1,16 @@
 # api/app.py
-from fastapi import FastAPI, Request
+import time
+_T0 = time.perf_counter()  # para medir el arranque en frío (cada worker mide el suyo)
+from fastapi import FastAPI
 from api.routes import predict, train, retrain, files, evaluate
-from fastapi.responses import HTMLResponse, Response
+from fastapi.responses import HTMLResponse, Response, JSONResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from pathlib import Path
 from src.logging import get_logger  
-import time, json, os
+from src.produccion import PRODUCCION
+from api.middleware import LogRequestsMiddleware
+import json, os, sys
 
 app = FastAPI(title="ODS Classifier API", version="2.0.0")
 logger = get_logger("api")
@@ -24,84 +28,45 @@ app.include_router(predict.router)
 app.include_router(evaluate.router) 
 
 # ----------------------------------------------------------------------
-# Logging Middleware (detallado)
+# Reporte de arranque
+# sklearn, pandas y nltk solo se importan cuando se usan por primera vez (al cargar
+# o entrenar un modelo); acá dejamos registro de cuánto tardó el import y qué quedó cargado.
 # ----------------------------------------------------------------------
-ALLOWED_PREFIXES = {"/predict", "/train", "/retrain", "/evaluate", "/files"}
-SKIP_PATHS = {"/docs", "/openapi.json", "/redoc", "/favicon.ico"}
-MAX_BODY_CHARS = 1000 
-def _preview_bytes(b: bytes) -> str:
-    if not b:
-        return "<empty>"
-    s = b.decode("utf-8", errors="replace")
-    return s if len(s) <= MAX_BODY_CHARS else s[:MAX_BODY_CHARS] + f"... <truncated {len(s)-MAX_BODY_CHARS} chars>"
-
-
-@app.middleware("http")
-async def log_requests(request: Request, call_next):
-    path = request.url.path
-    method = request.method
-
-    # ignora swagger/estáticos
-    if path in SKIP_PATHS or any(path.startswith(p) for p in ("/static", "/apple-touch-icon")):
-        return await call_next(request)
-
-    # solo rutas de negocio
-    business = any(path.startswith(p) for p in ALLOWED_PREFIXES)
-
-    start = time.perf_counter()
-
-    # --- request body (siempre intentamos leer; si no es JSON igual mostramos preview) ---
-    req_body_txt = None
-    raw_req = b""
-    try:
-        raw_req = await request.body()
-        if raw_req:
-            req_body_txt = _preview_bytes(raw_req)
-        else:
-            req_body_txt = "<empty>"
-        # reinyecta el body para que el endpoint pueda leerlo
-        async def receive():
-            return {"type": "http.request", "body": raw_req}
-        request = Request(request.scope, receive)
-    except Exception:
-        req_body_txt = "<error reading request body>"
-
-    if business:
-        logger.info(f"{method} {path} REQ={req_body_txt}")
-    else:
-        logger.info(f"{method} {path}")
-
-    # --- ejecutar endpoint y capturar respuesta ---
-    response = await call_next(request)
-    dur_ms = round((time.perf_counter() - start) * 1000, 2)
-
-    # siempre capturamos el body de la respuesta y reconstruimos
-    resp_preview = ""
-    try:
-        body_chunks = []
-        async for chunk in response.body_iterator:
-            body_chunks.append(chunk)
-        body_bytes = b"".join(body_chunks)
-        resp_preview = _preview_bytes(body_bytes)
-
-        # reconstruir respuesta para no romper el flujo
-        response = Response(
-            content=body_bytes,
-            status_code=response.status_code,
-            headers=dict(response.headers),
-            media_type=response.media_type,
-        )
-    except Exception:
-        resp_preview = "<error reading response body>"
-
-    if business:
-        logger.info(f"{method} {path} → {response.status_code} | {dur_ms}ms RESP={resp_preview}")
-    else:
-        logger.info(f"{method} {path} → {response.status_code} | {dur_ms}ms")
-
-    return response
-
+IMPORT_MS = round((time.perf_counter() - _T0) * 1000, 1)
+ARRANQUE_MS = None
+MODULOS_PESADOS = ("numpy", "scipy", "sklearn", "pandas", "nltk", "joblib")
+
+def reporte_arranque():
+    return {
+        "pid": os.getpid(),
+        "import_ms": IMPORT_MS,
+        "arranque_ms": ARRANQUE_MS,
+        "modulos_pesados": {m: m in sys.modules for m in MODULOS_PESADOS},
+    }
+
+@app.on_event("startup")
+def registrar_arranque():
+    global ARRANQUE_MS
+    ARRANQUE_MS = round((time.perf_counter() - _T0) * 1000, 1)
+    logger.info(f"Arranque {reporte_arranque()}")
+
+# el modelo de producción se carga en segundo plano: /health responde enseguida y
+# /health/ready recién da 200 cuando el modelo está en memoria
+@app.on_event("startup")
+def precargar_modelo_produccion():
+    PRODUCCION.precargar_en_segundo_plano()
+
+# lo mismo con el registro de modelos: si hay modelos sin registrar (copiados a mano, los del repo)
+# se abren acá y no en el primer GET /files/models
+@app.on_event("startup")
+def sincronizar_registro_modelos():
+    from src.registro import REGISTRO
+    REGISTRO.sincronizar_en_segundo_plano()
 
+# ----------------------------------------------------------------------
+# Logging Middleware (ASGI puro, sin leer los bodies: ver api/middleware.py)
+# ----------------------------------------------------------------------
+app.add_middleware(LogRequestsMiddleware)
 
 
 #---------------
@@ -111,4 +76,31 @@ async def log_requests(request: Request, call_next):
 # ruta básica de prueba
 @app.get("/health")
 def health():
-    return {"status": "ok"}
\ No newline at end of file
+    return {"status": "ok"}
+
+# readiness: 200 solo si este worker ya tiene cargado el modelo de producción
+# (para que el balanceador no le mande tráfico a un worker en frío)
+@app.get("/health/ready")
+def health_ready():
+    estado = PRODUCCION.estado()
+    return JSONResponse(status_code=200 if estado["listo"] else 503, content=estado)
+
+# cuánto tardó este worker en importar y arrancar
+@app.get("/health/arranque")
+def health_arranque():
+    return reporte_arranque()
+
+# cierra el colector de micro-lotes de /predict/async (si se llegó a usar)
+@app.on_event("shutdown")
+async def cerrar_microlotes():
+    from src.microlotes import AGRUPADOR
+    await AGRUPADOR.cerrar()
+
+# al apagar dejamos el cache de stems en disco para el próximo arranque
+# (si nunca se preprocesó nada el módulo ni se importó y no hay nada que guardar)
+@app.on_event("shutdown")
+def persistir_cache_stems():
+    preprocess = sys.modules.get("src.preprocess")
+    if preprocess is not None and preprocess.STEM_CACHE_PATH:
+        preprocess.guardar_cache_stems()
+        logger.info(f"Cache de stems guardado en {preprocess.STEM_CACHE_PATH} {preprocess.stats_cache_stems()}")
\ No newline at end of file
@@ -0,0 +1,49 @@
+# ----------------------------------------------------------------------
+# Filtros, orden y paginación de los listados de modelos (GET /files/models y GET /predict/models)
+# Se usa como dependencia: filtros: FiltrosModelos = Depends()
+# ----------------------------------------------------------------------
+from typing import Optional
+
+from fastapi import HTTPException, Query
+
+from src.registro import REGISTRO
+
+
+class FiltrosModelos:
+    def __init__(
+        self,
+        carpeta: Optional[str] = None,      # "" = solo models/, "retrained" = models/retrained/
+        formato: Optional[str] = None,      # "pkl" o "modelo"
+        min_f1: Optional[float] = None,
+        desde: Optional[str] = None,        # fecha ISO (creado >= desde)
+        hasta: Optional[str] = None,
+        orden: str = "ruta",                # ruta, creado, f1_macro o bytes
+        descendente: bool = False,
+        offset: int = Query(0, ge=0),
+        limite: Optional[int] = Query(None, ge=1),
+        detalle: bool = False,              # agrega hash, params, score, etc. de cada modelo
+    ):
+        self.carpeta = carpeta
+        self.formato = formato
+        self.min_f1 = min_f1
+        self.desde = desde
+        self.hasta = hasta
+        self.orden = orden
+        self.descendente = descendente
+        self.offset = offset
+        self.limite = limite
+        self.detalle = detalle
+
+    def listar(self, prefijo=""):
+        """Respuesta del listado desde el registro; prefijo se antepone a cada ruta (ej. 'models/')."""
+        try:
+            res = REGISTRO.buscar(carpeta=self.carpeta, formato=self.formato, min_f1=self.min_f1,
+                                  desde=self.desde, hasta=self.hasta, orden=self.orden,
+                                  descendente=self.descendente, offset=self.offset, limite=self.limite)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        salida = {"modelos": [f"{prefijo}{m['ruta']}" for m in res["modelos"]], "total": res["total"],
+                  "offset": self.offset, "limite": self.limite}
+        if self.detalle:
+            salida["detalle"] = res["modelos"]
+        return salida
@@ -0,0 +1,131 @@
+# ----------------------------------------------------------------------
+# Logging de requests como middleware ASGI puro
+# No lee ni reconstruye los bodies: solo mira pasar los mensajes de ASGI, así las respuestas en
+# streaming siguen saliendo de a partes y una predicción grande no queda dos veces en memoria.
+#
+# - Siempre: una línea por request con método, ruta, estado, duración y bytes enviados
+#   (si la respuesta salió en varias partes, también cuánto tardaron los headers).
+# - Preview de los bodies solo en las rutas que lo piden (RUTAS_PREVIEW: ruta -> fracción de
+#   requests a muestrear) y recortado a MAX_BODY_CHARS.
+# - Con nivel DEBUG (ODS_LOG_LEVEL=DEBUG) vuelve el detalle de antes: preview de request y
+#   respuesta de todas las rutas de negocio.
+# ----------------------------------------------------------------------
+import os
+import time
+import random
+import logging
+
+from src.logging import get_logger
+
+logger = get_logger("api")
+
+ALLOWED_PREFIXES = ("/predict", "/train", "/retrain", "/evaluate", "/files")
+SKIP_PATHS = {"/docs", "/openapi.json", "/redoc", "/favicon.ico"}
+SKIP_PREFIXES = ("/static", "/apple-touch-icon")
+MAX_BODY_CHARS = int(os.environ.get("ODS_LOG_MAX_BODY", 1000))
+MUESTREO_PREDICT = float(os.environ.get("ODS_LOG_MUESTREO", 0.01))
+
+# rutas con preview de bodies en INFO: las de entrenamiento son pocas y conviene verlas todas,
+# /predict es el grueso del tráfico y se muestrea
+RUTAS_PREVIEW = {
+    "/predict/": MUESTREO_PREDICT,
+    "/predict/async": MUESTREO_PREDICT,
+    "/train/streaming": 1.0,
+    "/retrain/json": 1.0,
+}
+
+
+class _Recorte:
+    """Guarda los primeros max_bytes de un body que se va mandando de a partes (y cuenta el total)."""
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.partes = []
+        self.guardados = 0
+        self.total = 0
+
+    def agregar(self, datos):
+        self.total += len(datos)
+        if self.guardados < self.max_bytes and datos:
+            parte = datos[:self.max_bytes - self.guardados]
+            self.partes.append(parte)
+            self.guardados += len(parte)
+
+    def preview(self):
+        if not self.total:
+            return "<empty>"
+        s = b"".join(self.partes).decode("utf-8", errors="replace")
+        if self.total > self.guardados:
+            s += f"... <truncated, {self.total} bytes>"
+        return s
+
+
+class LogRequestsMiddleware:
+    def __init__(self, app, rutas_preview=None, max_body=MAX_BODY_CHARS):
+        self.app = app
+        self.rutas_preview = RUTAS_PREVIEW if rutas_preview is None else rutas_preview
+        self.max_body = max_body
+
+    async def __call__(self, scope, receive, send):
+        path = scope.get("path", "")
+        # ignora websockets/lifespan, swagger y estáticos
+        if scope["type"] != "http" or path in SKIP_PATHS or path.startswith(SKIP_PREFIXES):
+            return await self.app(scope, receive, send)
+
+        method = scope["method"]
+        business = path.startswith(ALLOWED_PREFIXES)
+        tasa = self.rutas_preview.get(path)
+        muestreada = business and tasa is not None and random.random() < tasa
+        debug = business and logger.isEnabledFor(logging.DEBUG)
+        cuerpo_req = cuerpo_resp = None
+        if muestreada or debug:
+            cuerpo_req, cuerpo_resp = _Recorte(self.max_body), _Recorte(self.max_body)
+
+            async def receive_logueado():
+                mensaje = await receive()
+                if mensaje["type"] == "http.request":
+                    cuerpo_req.agregar(mensaje.get("body", b""))
+                return mensaje
+        else:
+            receive_logueado = receive
+
+        inicio = time.perf_counter()
+        respuesta = {"status": None, "headers_ms": None, "bytes": 0, "partes": 0}
+
+        async def send_logueado(mensaje):
+            if mensaje["type"] == "http.response.start":
+                respuesta["status"] = mensaje["status"]
+                respuesta["headers_ms"] = round((time.perf_counter() - inicio) * 1000, 2)
+            elif mensaje["type"] == "http.response.body":
+                body = mensaje.get("body", b"")
+                respuesta["bytes"] += len(body)
+                respuesta["partes"] += 1
+                if cuerpo_resp is not None:
+                    cuerpo_resp.agregar(body)
+            await send(mensaje)
+
+        try:
+            await self.app(scope, receive_logueado, send_logueado)
+        except Exception as e:
+            # el 500 lo arma el ServerErrorMiddleware de afuera; acá solo queda registrado
+            respuesta["status"] = respuesta["status"] or 500
+            logger.error(f"{_linea(method, path, inicio, respuesta)} | {type(e).__name__}: {e}")
+            raise
+
+        linea = _linea(method, path, inicio, respuesta)
+        if cuerpo_req is None:
+            logger.info(linea)
+            return
+        detalle = f" REQ={cuerpo_req.preview()} RESP={cuerpo_resp.preview()}"
+        if muestreada:
+            logger.info(linea + detalle)
+        else:
+            logger.info(linea)
+            logger.debug(f"{method} {path}{detalle}")
+
+
+def _linea(method, path, inicio, respuesta):
+    dur_ms = round((time.perf_counter() - inicio) * 1000, 2)
+    linea = f"{method} {path} → {respuesta['status']} | {dur_ms}ms | {respuesta['bytes']} bytes"
+    if respuesta["partes"] > 1:
+        linea += f" | {respuesta['headers_ms']}ms hasta los headers"
+    return linea
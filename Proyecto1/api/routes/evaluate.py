@@ -27,7 +27,7 @@ class EvalIn(BaseModel):
 def evaluate_from_file(body: EvalIn):
     try:
         res: Dict = evaluate_model_on_file(
-            body.model_name, body.test_file_name, body.text_col, body.label_col
+            body.model_name, body.test_file_name, body.text_col, body.label_col, usar_cache=True
         )
         return res
     except Exception as e:
@@ -1,9 +1,10 @@
 # ----------------------------------------------------------------------
 # Librerías
 # ----------------------------------------------------------------------
-from fastapi import APIRouter, UploadFile, File, HTTPException
+from fastapi import APIRouter, UploadFile, File, HTTPException, Depends
 from typing import List
 import os
+from api.filtros import FiltrosModelos
 
 router = APIRouter(prefix="/files", tags=["Archivos"])
 
@@ -35,29 +36,12 @@ def list_files() :
             files.append(path) 
     return {"archivos": files}
 
-# Listar modelos en la carpeta /models
+# Listar modelos en la carpeta /models (desde models/registro.json, ver src/registro.py)
+# Filtros opcionales y paginación con offset/limite (ver api/filtros.py)
 @router.get("/models")
-def list_models():
+def list_models(filtros: FiltrosModelos = Depends()):
     ensure_models_dir()
-    modelos = []
-    
-    # Buscar archivos .pkl en la carpeta models/
-    for fname in os.listdir(MODELS_DIRECTORY):
-        path = os.path.join(MODELS_DIRECTORY, fname)
-        if os.path.isfile(path) and fname.endswith(".pkl"):
-            modelos.append(fname)
-    
-    # Buscar archivos .pkl en subcarpetas (como retrained/)
-    for root, dirs, files in os.walk(MODELS_DIRECTORY):
-        for file in files:
-            if file.endswith(".pkl"):
-                # Obtener la ruta relativa desde models/
-                rel_path = os.path.relpath(os.path.join(root, file), MODELS_DIRECTORY)
-                # Solo agregar si no está ya en la lista (evitar duplicados)
-                if rel_path not in modelos and file not in modelos:
-                    modelos.append(rel_path.replace("\\", "/"))  # Normalizar separadores
-    
-    return {"modelos": modelos}
+    return filtros.listar()
 
 #Subir archivos a la carpeta /data
 @router.post("/upload")
@@ -1,9 +1,21 @@
 import os
-from fastapi import HTTPException
+import csv
+import io
+import json
+import shutil
+import tempfile
+from fastapi import HTTPException, UploadFile, File, Form, Depends
 from fastapi import APIRouter
+from fastapi.responses import StreamingResponse
 from typing import List, Optional
-from pydantic import BaseModel
-from src.pipeline import predecir, probabilidades, listar_modelos, cargar_modelo
+from pydantic import BaseModel, Field
+from src.pipeline import listar_modelos
+from api.filtros import FiltrosModelos
+from src.cache_modelos import CACHE_MODELOS, cargar_modelo_cacheado
+from src.cache_predicciones import CACHE_PREDICCIONES
+from src.produccion import PRODUCCION, ModeloNoListo
+from src.microlotes import AGRUPADOR
+from starlette.concurrency import run_in_threadpool
 
 router = APIRouter(prefix="/predict", tags=["Predicción"])
 #-------------
@@ -14,44 +26,210 @@ router = APIRouter(prefix="/predict", tags=["Predicción"])
 class PredictIn(BaseModel):
     textos: List[str]
     modelo_path: Optional[str] = None
+    top_k: Optional[int] = Field(None, ge=1)  # si viene, devuelve las k clases más probables
+
+class PromoverIn(BaseModel):
+    modelo_path: str   # nombre relativo a models/ (ej: retrained/model_nb_2025-10-13.pkl)
+
+class ClaseProba(BaseModel):
+    clase: int
+    probabilidad: float
 
 class PredictOut(BaseModel):
     texto: str
     prediccion: int
     confianza: float
+    top_k: Optional[List[ClaseProba]] = None
 
 #-------------
 # Endpoints 
 #-------------
 
-# Mostrar los modelos de la carpeta /models
+# Mostrar los modelos de la carpeta /models (mismos filtros y paginación que /files/models,
+# pero con la ruta que acepta modelo_path: models/...)
 @router.get("/models")
-def models():
-    return {"modelos": listar_modelos()}
+def models(filtros: FiltrosModelos = Depends()):
+    return filtros.listar(prefijo="models/")
+
+# Modelo al que apunta el alias "producción" (el que se usa si no se pide uno)
+@router.get("/produccion")
+def produccion():
+    return PRODUCCION.estado()
+
+# Cambia el modelo de producción: se carga completo y recién ahí se reemplaza
+@router.post("/promote")
+def promover(body: PromoverIn):
+    try:
+        return PRODUCCION.promover(body.modelo_path)
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+# Estado del cache de modelos cargados en este worker
+@router.get("/cache")
+def cache_modelos():
+    return CACHE_MODELOS.stats()
+
+# Estado del cache de predicciones de este worker (hits, repetidos dentro de cada lote)
+@router.get("/cache/predicciones")
+def cache_predicciones():
+    return CACHE_PREDICCIONES.stats()
+
+
+# Bundle del modelo pedido (o el de producción). None si no hay ningún modelo guardado.
+def resolver_modelo(modelo_path):
+    # si viene vacío, usa el modelo de producción (precargado al arrancar)
+    if not modelo_path:
+        try:
+            _, obj = PRODUCCION.obtener()
+        except ModeloNoListo as e:
+            if not listar_modelos():
+                return None
+            raise HTTPException(status_code=503, detail=str(e))
+    else:
+        # si es solo nombre (sin separador), asume carpeta models/
+        if os.path.sep not in modelo_path:
+            modelo_path = os.path.join("models", modelo_path)
+
+        if not os.path.exists(modelo_path):
+            raise HTTPException(status_code=400, detail=f"Modelo no encontrado: {modelo_path}")
+
+        obj = cargar_modelo_cacheado(modelo_path)  # {'model': pipe, 'metadata': {...}, 'hash_contenido': ...}
+    return obj
+
+# inferir() pasando por el cache de predicciones
+def inferir_cacheado(bundle, textos, top_k=None):
+    return CACHE_PREDICCIONES.inferir(bundle["model"], bundle.get("hash_contenido"), textos, top_k)
 
 
-@router.post("/", response_model=List[PredictOut])
+@router.post("/", response_model=List[PredictOut], response_model_exclude_none=True)
 def predict(body: PredictIn):
-    modelos = listar_modelos()
-    if not modelos:
+    bundle = resolver_modelo(body.modelo_path)
+    if bundle is None:
         return [PredictOut(texto=t, prediccion=-1, confianza=0.0) for t in body.textos]
 
-    # si viene vacío, usa el último
-    modelo_path = body.modelo_path or modelos[-1]
+    # una sola pasada de preprocesamiento + vectorización, solo para los textos que no están en el cache
+    return [PredictOut(**r) for r in inferir_cacheado(bundle, body.textos, top_k=body.top_k)]
+
+
+# Igual que /predict/ (también pasa por el cache de predicciones) pero no bloquea el event loop:
+# los textos de requests concurrentes se puntúan juntos en micro-lotes (ver src/microlotes.py)
+@router.post("/async", response_model=List[PredictOut], response_model_exclude_none=True)
+async def predict_async(body: PredictIn):
+    bundle = await run_in_threadpool(resolver_modelo, body.modelo_path)   # puede tener que cargarlo de disco
+    if bundle is None:
+        return [PredictOut(texto=t, prediccion=-1, confianza=0.0) for t in body.textos]
+    resultados = await AGRUPADOR.predecir(bundle["model"], body.textos, top_k=body.top_k,
+                                          hash_modelo=bundle.get("hash_contenido"))
+    return [PredictOut(**r) for r in resultados]
+
+# ----------------------------------------------------------------------
+# Predicción de un archivo completo, en streaming
+# El archivo (subido o ya en data/) se lee por lotes y cada lote se puntúa y se manda apenas
+# está listo, como NDJSON (una línea JSON por texto) o CSV. Nunca está el archivo entero en
+# memoria, ni del lado del servidor ni armando la respuesta.
+# ----------------------------------------------------------------------
+DATA_DIR = os.path.abspath("data")
+EXT_ARCHIVO = {".csv", ".xlsx", ".xls", ".parquet"}
+COLUMNAS_CSV = ["fila", "texto", "prediccion", "confianza"]
+
+def _ruta_en_data(nombre):
+    ruta = os.path.abspath(os.path.join(DATA_DIR, nombre))
+    if os.path.commonpath([ruta, DATA_DIR]) != DATA_DIR:
+        raise HTTPException(status_code=400, detail="El archivo tiene que estar dentro de data/")
+    if not os.path.isfile(ruta):
+        raise HTTPException(status_code=404, detail=f"Archivo no encontrado: {nombre}")
+    return ruta
+
+def _filas_predichas(bundle, lotes_df, text_col):
+    """(fila, texto, prediccion, confianza) por cada texto no vacío, lote a lote."""
+    fila = 0
+    for df in lotes_df:
+        columna = df[text_col]
+        validos = columna.notna().to_numpy()
+        textos = columna[validos].astype(str).tolist()
+        indices = [fila + i for i in range(len(columna)) if validos[i]]
+        fila += len(columna)
+        yield [(i, r["texto"], r["prediccion"], r["confianza"]) for i, r in zip(indices, inferir_cacheado(bundle, textos))]
+
+def _como_ndjson(lotes):
+    for lote in lotes:
+        yield "".join(json.dumps(dict(zip(COLUMNAS_CSV, r)), ensure_ascii=False) + "\n" for r in lote)
+
+def _como_csv(lotes):
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer)
+    escritor.writerow(COLUMNAS_CSV)
+    for lote in lotes:
+        escritor.writerows(lote)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+@router.post("/archivo")
+def predict_archivo(
+    text_col: str = Form(...),
+    archivo: Optional[UploadFile] = File(None),   # archivo subido...
+    ruta_data: Optional[str] = Form(None),        # ...o nombre de un archivo que ya está en data/
+    modelo_path: Optional[str] = Form(None),
+    formato: str = Form("ndjson"),                # "ndjson" o "csv"
+    tam_lote: int = Form(1000),
+):
+    from src.train_utils import read_file_por_lotes
+    if formato not in ("ndjson", "csv"):
+        raise HTTPException(status_code=400, detail="formato debe ser 'ndjson' o 'csv'")
+    if (archivo is None) == (ruta_data is None):
+        raise HTTPException(status_code=400, detail="Manda un archivo o ruta_data (uno de los dos)")
+    nombre = archivo.filename if archivo is not None else ruta_data
+    ext = os.path.splitext(nombre)[1].lower()
+    if ext not in EXT_ARCHIVO:
+        raise HTTPException(status_code=400, detail=f"Formato no soportado. Usa {', '.join(sorted(EXT_ARCHIVO))}")
+
+    bundle = resolver_modelo(modelo_path)
+    if bundle is None:
+        raise HTTPException(status_code=503, detail="No hay modelos entrenados")
+
+    temporal = None
+    if archivo is not None:
+        # el upload se copia por bloques a un temporal con la extensión correcta (lo necesitan pandas/openpyxl)
+        with tempfile.NamedTemporaryFile(suffix=ext, delete=False) as tmp:
+            shutil.copyfileobj(archivo.file, tmp)
+            temporal = ruta = tmp.name
+    else:
+        ruta = _ruta_en_data(ruta_data)
 
-    # si es solo nombre (sin separador), asume carpeta models/
-    if body.modelo_path and os.path.sep not in body.modelo_path:
-        modelo_path = os.path.join("models", body.modelo_path)
+    def lotes_df():
+        try:
+            yield from read_file_por_lotes(ruta, [text_col], tam_lote=max(1, tam_lote))
+        finally:
+            if temporal:
+                os.remove(temporal)
 
-    if not os.path.exists(modelo_path):
-        raise HTTPException(status_code=400, detail=f"Modelo no encontrado: {modelo_path}")
+    # se lee el primer lote antes de empezar a responder: si la columna no existe o el archivo
+    # está roto todavía se puede contestar con un 400
+    lotes = lotes_df()
+    try:
+        primero = next(lotes, None)
+    except Exception as e:
+        lotes.close()
+        raise HTTPException(status_code=400, detail=f"No se pudo leer el archivo ({e})")
 
-    obj = cargar_modelo(modelo_path)  # {'model': pipe, 'metadata': {...}}
-    pipe = obj["model"]
+    def todos():
+        if primero is not None:
+            yield primero
+        yield from lotes
 
-    y = predecir(pipe, body.textos)
-    p = probabilidades(pipe, body.textos)
-    conf = p.max(axis=1)
+    filas = _filas_predichas(bundle, todos(), text_col)
+    if formato == "csv":
+        base = os.path.splitext(os.path.basename(nombre))[0]
+        return StreamingResponse(_como_csv(filas), media_type="text/csv",
+                                 headers={"Content-Disposition": f'attachment; filename="{base}_predicciones.csv"'})
+    return StreamingResponse(_como_ndjson(filas), media_type="application/x-ndjson")
 
-    return [PredictOut(texto=t, prediccion=int(lbl), confianza=float(c))
-            for t, lbl, c in zip(body.textos, y, conf)]
\ No newline at end of file
+# Estadísticas de los micro-lotes de este worker
+@router.get("/async/stats")
+def microlotes_stats():
+    return AGRUPADOR.stats()
\ No newline at end of file
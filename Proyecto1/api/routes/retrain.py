@@ -11,11 +11,13 @@ router = APIRouter(prefix="/retrain", tags=["Re-Entrenamiento"])
 #-------------
 
 class RetrainIn(BaseModel):
-    base_file_path: str          # dataset base en /data
-    text_col: str
-    label_col: str
+    base_file_path: Optional[str] = None  # dataset base en /data (reentrenamiento completo)
+    text_col: Optional[str] = None
+    label_col: Optional[str] = None
     textos: List[str]            # nuevos textos
     labels: List[int]            # nuevas etiquetas
+    n_jobs: Optional[int] = None # núcleos para el CV (None = ODS_TRAIN_N_JOBS)
+    modelo_base: Optional[str] = None  # .pkl con estadísticas -> reentrenamiento incremental
 
 class RetrainOut(BaseModel):
     model_path: str
@@ -29,6 +31,7 @@ class RetrainOut(BaseModel):
 def retrain_with_json(body: RetrainIn):
     """
     Reentrena un modelo sumando nuevos textos/labels a un dataset base.
+    Con modelo_base solo se cuentan las muestras nuevas y se suman a las del modelo (incremental).
     Devuelve la ruta del nuevo modelo y metadatos de entrenamiento.
     """
     try:
@@ -38,6 +41,8 @@ def retrain_with_json(body: RetrainIn):
             label_col=body.label_col,
             nuevos_textos=body.textos,
             nuevos_labels=body.labels,
+            n_jobs=body.n_jobs,
+            modelo_base=body.modelo_base,
         )
         return {"model_path": ruta, "metadata": meta}
     except Exception as e:
@@ -1,4 +1,50 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, HTTPException
+from typing import List, Optional, Dict
+from pydantic import BaseModel
+import os
+from src.train_utils import train_streaming_from_file
 
 router = APIRouter(prefix="/train", tags=["Entrenamiento"])
 
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
+DATA_DIR = os.path.join(PROJECT_ROOT, "data")
+
+
+#-------------
+# Moldes
+#-------------
+
+class StreamingIn(BaseModel):
+    file_path: str                      # archivo en /data (.csv, .parquet o .xlsx)
+    text_col: str
+    label_col: str
+    clases: Optional[List[int]] = None  # si no se pasan se leen de la columna de labels
+    alpha: float = 0.3
+    n_features: int = 2 ** 18
+    tam_lote: int = 10_000
+
+class TrainOut(BaseModel):
+    model_path: str
+    metadata: Dict
+
+#-------------
+# Endpoints
+#-------------
+
+@router.post("/streaming", response_model=TrainOut)
+def train_streaming(body: StreamingIn):
+    """
+    Entrena un modelo leyendo el archivo por lotes (no lo carga entero en memoria).
+    Usa un espacio de features fijo (hashing) y actualiza el NB lote a lote.
+    """
+    ruta_archivo = body.file_path if os.path.exists(body.file_path) else os.path.join(DATA_DIR, body.file_path)
+    if not os.path.exists(ruta_archivo):
+        raise HTTPException(status_code=404, detail=f"Archivo no encontrado: {body.file_path}")
+    try:
+        ruta, meta = train_streaming_from_file(
+            ruta_archivo, body.text_col, body.label_col,
+            clases=body.clases, alpha=body.alpha, n_features=body.n_features, tam_lote=body.tam_lote,
+        )
+        return {"model_path": ruta, "metadata": meta}
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
@@ -0,0 +1,162 @@
+"""
+Formato de modelo sin pickle: una carpeta <nombre>.modelo con
+
+    manifiesto.json          formato, clases, ngram_range, firma del preprocesamiento y metadata
+    vocabulario.txt          un término por línea, en el orden de las columnas
+    log_prob_terminos.npy    (n_terminos, n_clases) = feature_log_prob_.T del MultinomialNB
+    log_prior_clases.npy     (n_clases,) = class_log_prior_
+    clases.npy               (n_clases,)
+
+Los .npy se abren con mmap: cargar no copia los parámetros a memoria y varios workers que
+abren el mismo modelo comparten las páginas del sistema operativo. Lo único que se arma en
+Python es el diccionario término -> columna. Predice igual que el Pipeline del que salió.
+
+Uso (desde la carpeta Proyecto1):
+    python -m src.artefacto models/model_nb_etapa2.pkl    # exporta un .pkl a .modelo
+"""
+
+import os
+import sys
+import json
+import shutil
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+EXT_ARTEFACTO = ".modelo"
+VERSION_FORMATO = 1
+
+
+def es_artefacto(ruta):
+    return os.path.isdir(ruta) and ruta.rstrip("/\\").endswith(EXT_ARTEFACTO)
+
+
+# ----------------------------------------------------------------------
+# Exportar
+# ----------------------------------------------------------------------
+
+def exportar_modelo(pipe, ruta_base="models/model_nb", metadata: dict | None = None):
+    """Escribe el pipeline (CountVectorizer + MultinomialNB) como carpeta .modelo y devuelve la ruta."""
+    from datetime import datetime
+    from src.estadisticas import config_del_pipeline
+    from src.preprocess import FIRMA_PREPROC
+
+    vectorizador = pipe.named_steps["vectorizador"]
+    clf = pipe.named_steps["clasificador"]
+    if not hasattr(vectorizador, "vocabulary_"):
+        raise ValueError("Solo se pueden exportar modelos con vocabulario (CountVectorizer), no los de hashing.")
+    terminos = vectorizador.get_feature_names_out()
+    if any("\n" in t for t in terminos):
+        raise ValueError("Hay términos con saltos de línea: no entran en vocabulario.txt")
+
+    ts = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+    ruta = f"{ruta_base}_{ts}{EXT_ARTEFACTO}"
+    os.makedirs(os.path.dirname(ruta_base) or ".", exist_ok=True)
+    manifiesto = {
+        "formato": VERSION_FORMATO,
+        "clases": clf.classes_.tolist(),
+        "n_terminos": len(terminos),
+        "ngram_range": list(config_del_pipeline(pipe)["ngram_range"]),
+        "firma_preprocesamiento": FIRMA_PREPROC,
+        "dtype": str(clf.feature_log_prob_.dtype),
+        "metadata": metadata or {},
+    }
+
+    # se escribe en una carpeta temporal y se renombra al final: nunca queda un .modelo a medias
+    tmp = f"{ruta}.tmp"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    with open(os.path.join(tmp, "vocabulario.txt"), "w", encoding="utf-8") as f:
+        f.write("\n".join(terminos))
+    np.save(os.path.join(tmp, "log_prob_terminos.npy"), np.ascontiguousarray(clf.feature_log_prob_.T))
+    np.save(os.path.join(tmp, "log_prior_clases.npy"), clf.class_log_prior_)
+    np.save(os.path.join(tmp, "clases.npy"), clf.classes_)
+    with open(os.path.join(tmp, "manifiesto.json"), "w", encoding="utf-8") as f:
+        json.dump(manifiesto, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, ruta)
+    from src.registro import REGISTRO
+    REGISTRO.registrar(ruta, manifiesto["metadata"])
+    print(f"-> Modelo exportado en: {ruta}")
+    return ruta
+
+
+# ----------------------------------------------------------------------
+# Cargar y predecir
+# ----------------------------------------------------------------------
+
+def cargar_artefacto(ruta):
+    """Devuelve {'model': ModeloArtefacto, 'metadata': {...}}, igual que cargar_modelo."""
+    with open(os.path.join(ruta, "manifiesto.json"), encoding="utf-8") as f:
+        manifiesto = json.load(f)
+    if manifiesto.get("formato") != VERSION_FORMATO:
+        raise ValueError(f"Formato de modelo no soportado: {manifiesto.get('formato')}")
+    return {"model": ModeloArtefacto(ruta, manifiesto), "metadata": manifiesto.get("metadata", {})}
+
+
+class ModeloArtefacto:
+    """Expone predict / predict_proba / classes_ como el Pipeline, así predecir() y
+    probabilidades() funcionan igual con cualquiera de los dos."""
+
+    def __init__(self, ruta, manifiesto):
+        from src.preprocess import AnalizadorTokens, FIRMA_PREPROC
+        from src.logging import get_logger
+        self.ruta = ruta
+        self.manifiesto = manifiesto
+        if manifiesto["firma_preprocesamiento"] != FIRMA_PREPROC:
+            get_logger("artefacto").warning(f"{ruta}: el preprocesamiento cambió desde que se exportó el modelo")
+
+        self.log_prob_terminos = np.load(os.path.join(ruta, "log_prob_terminos.npy"), mmap_mode="r")
+        self.log_prior_clases = np.load(os.path.join(ruta, "log_prior_clases.npy"), mmap_mode="r")
+        self.classes_ = np.load(os.path.join(ruta, "clases.npy"))
+        with open(os.path.join(ruta, "vocabulario.txt"), encoding="utf-8") as f:
+            terminos = f.read().split("\n")
+        self.vocabulario = dict(zip(terminos, range(len(terminos))))
+        self.analizador = AnalizadorTokens(ngram_range=tuple(manifiesto["ngram_range"]))
+
+    def __repr__(self):
+        return f"ModeloArtefacto({self.ruta!r})"
+
+    def vectorizar(self, textos):
+        """Matriz de conteos (n_textos, n_terminos), la misma que daría el CountVectorizer."""
+        import scipy.sparse as sp
+        from src.preprocess import preprocesar_varios
+        indices, indptr = [], [0]
+        for doc in preprocesar_varios(textos, usar_cache=False, tokens=True):
+            indices.extend(j for j in map(self.vocabulario.get, self.analizador(doc)) if j is not None)
+            indptr.append(len(indices))
+        datos = np.ones(len(indices), dtype=np.int32)
+        X = sp.csr_matrix((datos, np.asarray(indices, dtype=np.int32), np.asarray(indptr, dtype=np.int64)),
+                          shape=(len(indptr) - 1, len(self.vocabulario)))
+        X.sum_duplicates()
+        return X
+
+    def _jll(self, textos):
+        return self.vectorizar(textos) @ self.log_prob_terminos + self.log_prior_clases
+
+    def predict(self, textos):
+        return self.classes_[np.argmax(self._jll(textos), axis=1)]
+
+    def predict_log_proba(self, textos):
+        from scipy.special import logsumexp
+        jll = self._jll(textos)
+        return jll - np.atleast_2d(logsumexp(jll, axis=1)).T
+
+    def predict_proba(self, textos):
+        return np.exp(self.predict_log_proba(textos))
+
+
+def main(argv=None):
+    import argparse
+    from src.pipeline import cargar_modelo
+    parser = argparse.ArgumentParser(description="Exporta un modelo .pkl al formato .modelo (sin pickle, con mmap)")
+    parser.add_argument("pkl")
+    parser.add_argument("--destino", help="ruta base de salida (por defecto, la del .pkl sin extensión)")
+    args = parser.parse_args(argv)
+    bundle = cargar_modelo(args.pkl)
+    metadata = dict(bundle.get("metadata", {}), origen=os.path.basename(args.pkl))
+    exportar_modelo(bundle["model"], args.destino or os.path.splitext(args.pkl)[0], metadata)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
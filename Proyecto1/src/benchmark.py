@@ -0,0 +1,334 @@
+"""
+Verificaciones y benchmarks de rendimiento.
+
+Uso (desde la carpeta Proyecto1):
+    python -m src.benchmark paridad      # normalizador fusionado vs preprocesamiento por etapas
+    python -m src.benchmark cv --max-jobs 32   # tiempo de entrenar_modelo con 1..N núcleos
+    python -m src.benchmark mapreduce --max-jobs 8   # entrenamiento map-reduce con 1..N workers
+    python -m src.benchmark compacto   # modo compacto (int32/float32) vs float64 con evaluate_model_on_file
+    python -m src.benchmark motor      # motor de inferencia vs Pipeline: paridad en data/test y latencia p50/p99
+    python -m src.benchmark microlotes --concurrencia 32   # /predict/ vs /predict/async con clientes concurrentes
+    python -m src.benchmark microlotes --sin-cache   # lo mismo sin el cache de predicciones (solo el agrupamiento)
+"""
+
+import os
+import sys
+import glob
+import time
+import argparse
+import pandas as pd
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+from src.train_utils import read_file, prepare_data
+from src import preprocess
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(__file__))
+DATA_DIR = os.path.join(PROJECT_ROOT, "data")
+TRAIN_DEFECTO = os.path.join(DATA_DIR, "train", "DatosAumentadosTrain.xlsx")
+EXTENSIONES = (".csv", ".xlsx", ".xls")
+
+
+def archivos_data(carpeta=DATA_DIR):
+    rutas = glob.glob(os.path.join(carpeta, "**", "*"), recursive=True)
+    return sorted(r for r in rutas if os.path.splitext(r)[1].lower() in EXTENSIONES)
+
+
+def textos_de_archivo(ruta):
+    """Todas las celdas de texto del archivo (cualquier columna de texto)."""
+    df = read_file(ruta)
+    textos = []
+    for col in df.columns:
+        if df[col].dtype == object or pd.api.types.is_string_dtype(df[col]):
+            textos.extend(str(v) for v in df[col].dropna())
+    return textos
+
+
+# ----------------------------------------------------------------------
+# Paridad del normalizador fusionado
+# ----------------------------------------------------------------------
+
+def paridad(args):
+    total_dif = 0
+    for ruta in archivos_data():
+        textos = textos_de_archivo(ruta)
+
+        t0 = time.perf_counter()
+        esperado = [preprocess.preprocesar_texto_por_etapas(t) for t in textos]
+        t1 = time.perf_counter()
+        obtenido = [preprocess.preprocesar_texto(t) for t in textos]
+        t2 = time.perf_counter()
+
+        difs = [t for t, a, b in zip(textos, esperado, obtenido) if a != b]
+        total_dif += len(difs)
+        print(f"{os.path.relpath(ruta, PROJECT_ROOT)}: {len(textos)} textos, {len(difs)} diferencias "
+              f"(etapas {t1 - t0:.2f}s, fusionado {t2 - t1:.2f}s)")
+        for t in difs[:3]:
+            print(f"   -> {t[:80]!r}")
+    print("OK" if total_dif == 0 else f"FALLO: {total_dif} diferencias")
+    return 0 if total_dif == 0 else 1
+
+
+# ----------------------------------------------------------------------
+# Escalamiento del CV de entrenamiento con n_jobs
+# ----------------------------------------------------------------------
+
+def niveles_jobs(max_jobs):
+    """1, 2, 4, ... hasta max_jobs (incluido)."""
+    niveles, n = [], 1
+    while n < max_jobs:
+        niveles.append(n)
+        n *= 2
+    return niveles + [max_jobs]
+
+
+def medir(funcion, repeticiones):
+    """Mejor tiempo de varias corridas (después de una de calentamiento) y el último resultado."""
+    resultado = funcion()
+    tiempos = []
+    for _ in range(repeticiones):
+        t0 = time.perf_counter()
+        resultado = funcion()
+        tiempos.append(time.perf_counter() - t0)
+    return min(tiempos), resultado
+
+
+def cargar_entrenamiento(args):
+    X, y = prepare_data(read_file(args.archivo), args.text_col, args.label_col)
+    return X * args.replicar, y * args.replicar
+
+
+def escalamiento_cv(args):
+    from src.pipeline import entrenar_modelo
+    X, y = cargar_entrenamiento(args)
+    print(f"{len(X)} textos, {os.cpu_count()} núcleos disponibles")
+    print(f"{'n_jobs':>6} {'segundos':>9} {'speedup':>8}  params / score")
+    base = None
+    for n_jobs in niveles_jobs(args.max_jobs):
+        segundos, (_, params, score) = medir(lambda: entrenar_modelo(X, y, n_jobs=n_jobs), args.repeticiones)
+        base = base or segundos
+        print(f"{n_jobs:>6} {segundos:>9.2f} {base / segundos:>7.2f}x  {params} {score:.6f}")
+    return 0
+
+
+# ----------------------------------------------------------------------
+# Escalamiento del entrenamiento map-reduce (y que dé lo mismo que un fit normal)
+# ----------------------------------------------------------------------
+
+def mismo_modelo(a, b):
+    import numpy as np
+    va, vb = a.named_steps["vectorizador"], b.named_steps["vectorizador"]
+    ca, cb = a.named_steps["clasificador"], b.named_steps["clasificador"]
+    return (va.vocabulary_ == vb.vocabulary_
+            and np.array_equal(ca.classes_, cb.classes_)
+            and np.array_equal(ca.feature_log_prob_, cb.feature_log_prob_)
+            and np.array_equal(ca.class_log_prior_, cb.class_log_prior_))
+
+
+def escalamiento_mapreduce(args):
+    from src.pipeline import construir_pipeline, entrenar_modelo_mapreduce
+    rutas = [args.archivo] if args.archivo else archivos_data(os.path.join(DATA_DIR, "train"))
+    fallos = 0
+    for ruta in rutas:
+        args.archivo = ruta
+        X, y = cargar_entrenamiento(args)
+        referencia = construir_pipeline(alpha=args.alpha).fit(X, y)
+        print(f"{os.path.relpath(ruta, PROJECT_ROOT)}: {len(X)} textos, {os.cpu_count()} núcleos disponibles")
+        print(f"{'workers':>7} {'segundos':>9} {'speedup':>8}  igual al fit")
+        base = None
+        for n in niveles_jobs(args.max_jobs):
+            segundos, (pipe, _, _) = medir(lambda: entrenar_modelo_mapreduce(X, y, alpha=args.alpha, n_workers=n), args.repeticiones)
+            base = base or segundos
+            igual = mismo_modelo(pipe, referencia)
+            fallos += not igual
+            print(f"{n:>7} {segundos:>9.2f} {base / segundos:>7.2f}x  {'sí' if igual else 'NO'}")
+    print("OK" if not fallos else f"FALLO: {fallos} modelos distintos")
+    return 0 if not fallos else 1
+
+
+# ----------------------------------------------------------------------
+# Modo compacto vs float64: tamaño del .pkl, de las matrices de conteo y métricas en test
+# ----------------------------------------------------------------------
+
+def bytes_sparse(X):
+    return X.data.nbytes + X.indices.nbytes + X.indptr.nbytes
+
+
+def comparar_compacto(args):
+    import shutil
+    from src.pipeline import entrenar_modelo, guardar_modelo
+    from src.evaluate import evaluate_model_on_file, MODELS_DIR, DATA_TEST
+    X, y = cargar_entrenamiento(args)
+    carpeta = os.path.join(MODELS_DIR, "benchmark_compacto")
+    modelos = {}
+    try:
+        for nombre, compacto in (("float64", False), ("compacto", True)):
+            pipe, params, score = entrenar_modelo(X, y, compacto=compacto)
+            ruta = guardar_modelo(pipe, ruta_base=os.path.join(carpeta, f"model_nb_{nombre}"), metadata={"params": params})
+            vectorizado = pipe[:-1].transform(X)
+            modelos[nombre] = os.path.relpath(ruta, MODELS_DIR)
+            print(f"{nombre:>9}: params {params} f1 CV {score:.6f} | pkl {os.path.getsize(ruta) / 1024:.0f} KB"
+                  f" | conteos train {bytes_sparse(vectorizado) / 1024:.0f} KB ({vectorizado.dtype})")
+
+        peor = 0.0
+        for archivo in sorted(os.listdir(DATA_TEST)):
+            metricas = {n: evaluate_model_on_file(m, archivo, args.text_col, args.label_col) for n, m in modelos.items()}
+            dif = max(abs(metricas["compacto"][k] - metricas["float64"][k]) for k in metricas["float64"])
+            peor = max(peor, dif)
+            print(f"{archivo}: f1_macro float64 {metricas['float64']['f1_macro']:.6f}"
+                  f" compacto {metricas['compacto']['f1_macro']:.6f} (máx. diferencia en métricas {dif:.2e})")
+    finally:
+        shutil.rmtree(carpeta, ignore_errors=True)
+    print("OK" if peor <= args.tolerancia else f"FALLO: diferencia {peor:.2e} > {args.tolerancia}")
+    return 0 if peor <= args.tolerancia else 1
+
+
+# ----------------------------------------------------------------------
+# Motor de inferencia: paridad con el Pipeline y latencia por texto
+# ----------------------------------------------------------------------
+
+def percentiles_us(tiempos):
+    import numpy as np
+    p50, p99 = np.percentile(np.asarray(tiempos) * 1e6, [50, 99])
+    return f"p50 {p50:8.1f} µs  p99 {p99:8.1f} µs"
+
+
+def latencias(funcion, textos, repeticiones):
+    funcion(textos[0])  # calentamiento
+    tiempos = []
+    for _ in range(repeticiones):
+        for t in textos:
+            t0 = time.perf_counter()
+            funcion(t)
+            tiempos.append(time.perf_counter() - t0)
+    return tiempos
+
+
+def comparar_motor(args):
+    import numpy as np
+    from src.pipeline import cargar_modelo
+    from src.motor import compilar_motor
+    from src.evaluate import DATA_TEST
+    pipe = cargar_modelo(args.modelo)["model"]
+    motor = compilar_motor(pipe)
+
+    textos = []
+    for ruta in archivos_data(DATA_TEST):
+        textos.extend(prepare_data(read_file(ruta), args.text_col, args.label_col)[0])
+    esperado, obtenido = pipe.predict_proba(textos), motor.predict_proba(textos)
+    etiquetas_ok = np.array_equal(pipe.predict(textos), motor.predict(textos))
+    dif = float(np.abs(esperado - obtenido).max())
+    print(f"{len(textos)} textos de data/test | etiquetas iguales: {'sí' if etiquetas_ok else 'NO'}"
+          f" | probabilidades idénticas: {int((esperado == obtenido).all(axis=1).sum())}/{len(textos)}"
+          f" | máx. diferencia {dif:.2e}")
+
+    muestra = textos[:args.muestra]
+    pipeline = latencias(lambda t: (pipe.predict([t]), pipe.predict_proba([t])), muestra, args.repeticiones)
+    rapido = latencias(motor.puntuar, muestra, args.repeticiones)
+    print(f"Pipeline predict + predict_proba: {percentiles_us(pipeline)}")
+    print(f"MotorInferencia.puntuar:          {percentiles_us(rapido)}")
+    print(f"speedup p50 {np.median(pipeline) / np.median(rapido):.1f}x")
+    ok = etiquetas_ok and dif <= 1e-12
+    print("OK" if ok else "FALLO")
+    return 0 if ok else 1
+
+
+# ----------------------------------------------------------------------
+# /predict/ (un request a la vez) vs /predict/async (micro-lotes) con clientes concurrentes.
+# Corre la app en el mismo proceso (httpx + ASGITransport), sin red de por medio.
+# Los dos endpoints pasan por el cache de predicciones: se vacía antes de cada corrida para que
+# ambos vean los mismos repetidos (--sin-cache lo apaga y mide solo el agrupamiento).
+# ----------------------------------------------------------------------
+
+async def _carga(cliente, ruta, modelo, textos, concurrencia, total):
+    import asyncio
+    latencias, pendientes = [], iter(range(total))
+
+    async def usuario():
+        for i in pendientes:
+            t0 = time.perf_counter()
+            r = await cliente.post(ruta, json={"textos": [textos[i % len(textos)]], "modelo_path": modelo})
+            r.raise_for_status()
+            latencias.append(time.perf_counter() - t0)
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(usuario() for _ in range(concurrencia)))
+    return total / (time.perf_counter() - t0), latencias
+
+
+async def _comparar_microlotes(args, textos):
+    import httpx
+    from api.app import app
+    from src.microlotes import AGRUPADOR
+    from src.cache_predicciones import CACHE_PREDICCIONES
+    modelo = os.path.basename(args.modelo)
+    if args.sin_cache:
+        CACHE_PREDICCIONES.max_entradas = 0
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as cliente:
+        await _carga(cliente, "/predict/", modelo, textos, 1, 20)   # calentamiento (carga el modelo)
+        await _carga(cliente, "/predict/async", modelo, textos, 1, 20)
+        print(f"cache de predicciones: {'apagado' if args.sin_cache else 'vacío al empezar cada corrida'}")
+        for concurrencia in (1, args.concurrencia):
+            for ruta in ("/predict/", "/predict/async"):
+                CACHE_PREDICCIONES.invalidar()
+                req_s, lat = await _carga(cliente, ruta, modelo, textos, concurrencia, args.requests)
+                print(f"concurrencia {concurrencia:>3} {ruta:<15} {req_s:8.1f} req/s  {percentiles_us(lat)}")
+        await AGRUPADOR.cerrar()
+    print(f"micro-lotes: {AGRUPADOR.stats()}")
+
+
+def comparar_microlotes(args):
+    import asyncio
+    from src.evaluate import DATA_TEST
+    textos = prepare_data(read_file(os.path.join(DATA_TEST, "DatosAumentadosTest.xlsx")), "textos", "labels")[0]
+    asyncio.run(_comparar_microlotes(args, textos))
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="comando", required=True)
+    sub.add_parser("paridad", help="compara el normalizador fusionado con el preprocesamiento por etapas")
+
+    cv = sub.add_parser("cv", help="tiempo de entrenar_modelo con 1..N núcleos")
+    agregar_args_entrenamiento(cv)
+    cv.add_argument("--max-jobs", type=int, default=os.cpu_count())
+
+    mr = sub.add_parser("mapreduce", help="entrenamiento map-reduce con 1..N workers (todos los archivos de data/train)")
+    agregar_args_entrenamiento(mr)
+    mr.set_defaults(archivo=None)
+    mr.add_argument("--max-jobs", type=int, default=os.cpu_count())
+    mr.add_argument("--alpha", type=float, default=0.3)
+
+    co = sub.add_parser("compacto", help="modo compacto (int32/float32) vs float64 sobre los archivos de data/test")
+    agregar_args_entrenamiento(co)
+    co.add_argument("--tolerancia", type=float, default=1e-3, help="diferencia máxima aceptada en las métricas")
+
+    mo = sub.add_parser("motor", help="motor de inferencia vs Pipeline: paridad en data/test y latencia p50/p99")
+    mo.add_argument("--modelo", default=os.path.join(PROJECT_ROOT, "models", "model_nb_etapa2.pkl"))
+    mo.add_argument("--text-col", default="textos")
+    mo.add_argument("--label-col", default="labels")
+    mo.add_argument("--muestra", type=int, default=300, help="textos usados para medir latencia")
+    mo.add_argument("--repeticiones", type=int, default=3)
+
+    ml = sub.add_parser("microlotes", help="/predict/ vs /predict/async con clientes concurrentes")
+    ml.add_argument("--modelo", default=os.path.join(PROJECT_ROOT, "models", "model_nb_etapa2.pkl"))
+    ml.add_argument("--concurrencia", type=int, default=32)
+    ml.add_argument("--requests", type=int, default=1000)
+    ml.add_argument("--sin-cache", action="store_true", help="apaga el cache de predicciones en los dos endpoints")
+
+    args = parser.parse_args(argv)
+    comandos = {"paridad": paridad, "cv": escalamiento_cv, "mapreduce": escalamiento_mapreduce,
+                "compacto": comparar_compacto, "motor": comparar_motor, "microlotes": comparar_microlotes}
+    return comandos[args.comando](args)
+
+
+def agregar_args_entrenamiento(parser):
+    parser.add_argument("--archivo", default=TRAIN_DEFECTO)
+    parser.add_argument("--text-col", default="textos")
+    parser.add_argument("--label-col", default="labels")
+    parser.add_argument("--replicar", type=int, default=1, help="repite el dataset k veces para simular uno más grande")
+    parser.add_argument("--repeticiones", type=int, default=3)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
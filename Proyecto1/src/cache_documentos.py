@@ -0,0 +1,113 @@
+"""
+Cache persistente de textos preprocesados.
+
+- La clave es un hash del texto + la firma de la configuración de preprocesamiento,
+  así que si cambian stopwords/stemmer/versión las entradas viejas simplemente no se usan.
+- Vive en un SQLite (modo WAL) para que lo compartan varios procesos y sobreviva reinicios.
+- Tiene un tamaño máximo en bytes; al pasarse se borran las entradas usadas hace más tiempo.
+"""
+
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+
+# SQLite no acepta listas enormes en un IN (...), así que consultamos por tandas
+TAM_CONSULTA = 500
+
+
+def clave_texto(texto, firma):
+    return hashlib.blake2b(f"{firma}\x00{texto}".encode("utf-8"), digest_size=16).hexdigest()
+
+
+class CacheDocumentos:
+    def __init__(self, ruta, firma, max_bytes=256 * 1024 * 1024):
+        self.ruta = ruta
+        self.firma = firma
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._local = threading.local()  # una conexión por hilo
+        os.makedirs(os.path.dirname(os.path.abspath(ruta)), exist_ok=True)
+        con = self._con()
+        con.execute(
+            "CREATE TABLE IF NOT EXISTS docs ("
+            " clave TEXT PRIMARY KEY, valor TEXT NOT NULL, bytes INTEGER NOT NULL, usado REAL NOT NULL)"
+        )
+        con.execute("CREATE INDEX IF NOT EXISTS idx_docs_usado ON docs(usado)")
+        con.commit()
+
+    def _con(self):
+        con = getattr(self._local, "con", None)
+        if con is None:
+            con = sqlite3.connect(self.ruta, timeout=30)
+            con.execute("PRAGMA journal_mode=WAL")
+            con.execute("PRAGMA synchronous=NORMAL")
+            self._local.con = con
+        return con
+
+    def obtener(self, claves):
+        """Devuelve {clave: valor} para las claves que estén en el cache y les refresca el uso."""
+        con = self._con()
+        encontrados = {}
+        unicas = list(dict.fromkeys(claves))
+        for i in range(0, len(unicas), TAM_CONSULTA):
+            tanda = unicas[i:i + TAM_CONSULTA]
+            marcas = ",".join("?" * len(tanda))
+            filas = con.execute(f"SELECT clave, valor FROM docs WHERE clave IN ({marcas})", tanda)
+            encontrados.update(filas)
+        if encontrados:
+            ahora = time.time()
+            con.executemany("UPDATE docs SET usado = ? WHERE clave = ?", [(ahora, c) for c in encontrados])
+            con.commit()
+        self.hits += len(encontrados)
+        self.misses += len(unicas) - len(encontrados)
+        return encontrados
+
+    def guardar(self, pares):
+        """Guarda pares (clave, valor) y recorta el cache si se pasa de tamaño."""
+        if not pares:
+            return
+        ahora = time.time()
+        con = self._con()
+        con.executemany(
+            "INSERT OR REPLACE INTO docs (clave, valor, bytes, usado) VALUES (?, ?, ?, ?)",
+            [(c, v, len(c) + len(v.encode("utf-8")), ahora) for c, v in pares],
+        )
+        con.commit()
+        self._recortar(con)
+
+    def _recortar(self, con):
+        total = con.execute("SELECT COALESCE(SUM(bytes), 0) FROM docs").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        # dejamos un margen del 10% para no recortar en cada escritura
+        sobrante = total - int(self.max_bytes * 0.9)
+        borrar = []
+        for clave, nbytes in con.execute("SELECT clave, bytes FROM docs ORDER BY usado"):
+            borrar.append((clave,))
+            sobrante -= nbytes
+            if sobrante <= 0:
+                break
+        con.executemany("DELETE FROM docs WHERE clave = ?", borrar)
+        con.commit()
+
+    def stats(self):
+        filas, total = self._con().execute("SELECT COUNT(*), COALESCE(SUM(bytes), 0) FROM docs").fetchone()
+        consultas = self.hits + self.misses
+        return {
+            "ruta": self.ruta,
+            "entradas": filas,
+            "bytes": total,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / consultas, 4) if consultas else 0.0,
+        }
+
+    def limpiar(self):
+        con = self._con()
+        con.execute("DELETE FROM docs")
+        con.commit()
+        self.hits = self.misses = 0
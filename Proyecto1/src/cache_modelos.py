@@ -0,0 +1,144 @@
+"""
+Cache de modelos cargados dentro del proceso de la API.
+
+- La clave es la ruta absoluta; cada entrada guarda (mtime, tamaño) del archivo y si cambian
+  (se reentrenó / reescribió el modelo) la entrada se descarta y se vuelve a cargar.
+- Está acotado por cantidad de modelos y por bytes (se usa el tamaño en disco como estimación
+  de lo que ocupa cargado); al pasarse se saca el usado hace más tiempo (LRU).
+- Si llegan varias requests a la vez por un modelo que no está, se carga una sola vez y
+  las demás esperan esa misma carga.
+- Al cargar se calcula un hash del contenido del modelo (bundle["hash_contenido"]): el cache de
+  predicciones lo usa como clave, así dos copias del mismo modelo comparten resultados y un
+  modelo reescrito nunca reutiliza los viejos.
+"""
+
+import os
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+
+from src.logging import get_logger
+
+logger = get_logger("cache_modelos")
+
+MODEL_CACHE_MAX = int(os.environ.get("ODS_MODEL_CACHE_MAX", 4))
+MODEL_CACHE_MB = int(os.environ.get("ODS_MODEL_CACHE_MB", 1024))
+
+
+def huella_archivo(ruta):
+    """(mtime_ns, bytes) del archivo; para una carpeta .modelo, el último mtime y la suma de sus archivos."""
+    if os.path.isdir(ruta):
+        stats = [e.stat() for e in os.scandir(ruta) if e.is_file()]
+        return max((s.st_mtime_ns for s in stats), default=0), sum(s.st_size for s in stats)
+    st = os.stat(ruta)
+    return st.st_mtime_ns, st.st_size
+
+
+def hash_contenido(ruta):
+    """sha1 de los bytes del modelo; para una carpeta .modelo, de sus archivos en orden de nombre."""
+    h = hashlib.sha1()
+    carpeta = os.path.isdir(ruta)
+    archivos = sorted(e.path for e in os.scandir(ruta) if e.is_file()) if carpeta else [ruta]
+    for archivo in archivos:
+        if carpeta:
+            h.update(os.path.basename(archivo).encode() + b"\0")
+        with open(archivo, "rb") as f:
+            for bloque in iter(lambda: f.read(1 << 20), b""):
+                h.update(bloque)
+    return h.hexdigest()
+
+
+class CacheModelos:
+    def __init__(self, max_modelos=MODEL_CACHE_MAX, max_bytes=MODEL_CACHE_MB * 1024 * 1024, cargador=None):
+        self.max_modelos = max_modelos
+        self.max_bytes = max_bytes
+        self._cargador = cargador
+        self._entradas = OrderedDict()   # ruta -> (huella, bundle)
+        self._cargando = {}              # ruta -> Future de la carga en curso
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.cargas = self.invalidaciones = self.evicciones = 0
+
+    def _cargar(self, ruta):
+        if self._cargador is None:
+            from src.pipeline import cargar_modelo
+            return cargar_modelo(ruta)
+        return self._cargador(ruta)
+
+    def obtener(self, ruta):
+        """Bundle {'model', 'metadata', ...} como el de cargar_modelo, desde el cache si está al día."""
+        ruta = os.path.abspath(ruta)
+        huella = huella_archivo(ruta)   # FileNotFoundError si no existe, como cargar_modelo
+        with self._lock:
+            entrada = self._entradas.get(ruta)
+            if entrada is not None and entrada[0] == huella:
+                self._entradas.move_to_end(ruta)
+                self.hits += 1
+                return entrada[1]
+            if entrada is not None:
+                del self._entradas[ruta]
+                self.invalidaciones += 1
+            self.misses += 1
+            futuro = self._cargando.get(ruta)
+            propia = futuro is None
+            if propia:
+                futuro = self._cargando[ruta] = Future()
+        if not propia:
+            return futuro.result()   # otra request ya lo está cargando
+
+        try:
+            bundle = self._cargar(ruta)
+            if isinstance(bundle, dict):
+                bundle["hash_contenido"] = hash_contenido(ruta)
+        except BaseException as e:
+            with self._lock:
+                del self._cargando[ruta]
+            futuro.set_exception(e)
+            raise
+        with self._lock:
+            del self._cargando[ruta]
+            self.cargas += 1
+            self._entradas[ruta] = (huella, bundle)
+            self._recortar()
+        futuro.set_result(bundle)
+        return bundle
+
+    def _recortar(self):
+        # el último (recién cargado) no se saca aunque solo él ya se pase del límite de bytes
+        while len(self._entradas) > 1 and (len(self._entradas) > self.max_modelos or self._bytes() > self.max_bytes):
+            ruta, _ = self._entradas.popitem(last=False)
+            self.evicciones += 1
+            logger.info(f"Modelo sacado del cache: {ruta}")
+
+    def _bytes(self):
+        return sum(huella[1] for huella, _ in self._entradas.values())
+
+    def invalidar(self, ruta=None):
+        with self._lock:
+            if ruta is None:
+                self._entradas.clear()
+            else:
+                self._entradas.pop(os.path.abspath(ruta), None)
+
+    def stats(self):
+        with self._lock:
+            consultas = self.hits + self.misses
+            return {
+                "modelos": list(self._entradas),
+                "bytes": self._bytes(),
+                "max_modelos": self.max_modelos,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "cargas": self.cargas,
+                "invalidaciones": self.invalidaciones,
+                "evicciones": self.evicciones,
+                "hit_rate": round(self.hits / consultas, 4) if consultas else 0.0,
+            }
+
+
+CACHE_MODELOS = CacheModelos()
+
+
+def cargar_modelo_cacheado(ruta):
+    return CACHE_MODELOS.obtener(ruta)
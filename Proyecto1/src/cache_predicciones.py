@@ -0,0 +1,109 @@
+"""
+Cache de predicciones: (hash del modelo, hash del texto) -> probabilidades por clase.
+
+Muchos textos se repiten, dentro de un mismo lote y entre requests (archivos que se vuelven a
+subir, el mismo párrafo clasificado con varios modelos). Antes de correr el pipeline:
+
+- los textos repetidos del lote se puntúan una sola vez;
+- los que ya están en el cache no se puntúan; solo pasan por el modelo los que faltan.
+
+- El hash del modelo es el de su contenido (ver cache_modelos.hash_contenido): si el archivo
+  cambia, cambia la clave y los resultados viejos no se usan más (salen del cache por LRU).
+- El texto se normaliza antes del hash (minúsculas y espacios colapsados), algo que el
+  preprocesamiento ya hace igual, así que dos textos con la misma clave dan el mismo resultado.
+- Se guarda la fila de probabilidades, no el dict de salida: sirve para cualquier top_k.
+- Acotado por cantidad de entradas; al pasarse se saca la usada hace más tiempo.
+"""
+
+import os
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+PRED_CACHE_MAX = int(os.environ.get("ODS_PRED_CACHE_MAX", 100_000))
+
+
+def normalizar_texto(texto):
+    return " ".join(texto.lower().split())
+
+
+def hash_texto(texto):
+    return hashlib.sha1(normalizar_texto(texto).encode("utf-8")).digest()
+
+
+class CachePredicciones:
+    def __init__(self, max_entradas=PRED_CACHE_MAX):
+        self.max_entradas = max_entradas
+        self._entradas = OrderedDict()   # (hash_modelo, hash_texto) -> probabilidades (n_clases,)
+        self._lock = threading.Lock()
+        self.textos = self.repetidos = self.hits = self.misses = self.evicciones = 0
+
+    def inferir(self, pipe, hash_modelo, textos, top_k=None):
+        """Lo mismo que inferir(pipe, textos, top_k), puntuando solo los textos nuevos."""
+        from src.pipeline import inferir, armar_resultados
+        textos = list(textos)
+        if not textos or hash_modelo is None or self.max_entradas <= 0:
+            return inferir(pipe, textos, top_k)
+
+        claves = [(hash_modelo, hash_texto(t)) for t in textos]
+        unicas = dict.fromkeys(claves)   # clave -> probabilidades (None = falta puntuar)
+        with self._lock:
+            for clave in unicas:
+                fila = self._entradas.get(clave)
+                if fila is not None:
+                    self._entradas.move_to_end(clave)
+                    unicas[clave] = fila
+        faltan = [clave for clave, fila in unicas.items() if fila is None]
+
+        if faltan:
+            # un texto por clave: el primero del lote que la tiene
+            primero = {}
+            for clave, texto in zip(claves, textos):
+                primero.setdefault(clave, texto)
+            proba = np.asarray(pipe.predict_proba([primero[c] for c in faltan]))
+            proba.flags.writeable = False
+            for clave, fila in zip(faltan, proba):
+                unicas[clave] = fila
+
+        with self._lock:
+            self.textos += len(textos)
+            self.repetidos += len(textos) - len(unicas)
+            self.hits += len(unicas) - len(faltan)
+            self.misses += len(faltan)
+            for clave in faltan:
+                self._entradas[clave] = unicas[clave]
+            while len(self._entradas) > self.max_entradas:
+                self._entradas.popitem(last=False)
+                self.evicciones += 1
+
+        return armar_resultados(textos, np.array([unicas[c] for c in claves]), pipe.classes_, top_k)
+
+    def invalidar(self, hash_modelo=None):
+        with self._lock:
+            if hash_modelo is None:
+                self._entradas.clear()
+            else:
+                for clave in [c for c in self._entradas if c[0] == hash_modelo]:
+                    del self._entradas[clave]
+
+    def stats(self):
+        with self._lock:
+            consultas = self.hits + self.misses
+            return {
+                "entradas": len(self._entradas),
+                "max_entradas": self.max_entradas,
+                "modelos": len({c[0] for c in self._entradas}),
+                "textos": self.textos,
+                "repetidos_en_lote": self.repetidos,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evicciones": self.evicciones,
+                "hit_rate": round(self.hits / consultas, 4) if consultas else 0.0,
+                # fracción de textos que no pasaron por el modelo (repetidos + hits)
+                "ahorro": round(1 - self.misses / self.textos, 4) if self.textos else 0.0,
+            }
+
+
+CACHE_PREDICCIONES = CachePredicciones()
@@ -0,0 +1,166 @@
+"""
+Estadísticas suficientes del Naive Bayes multinomial.
+
+Un MultinomialNB + CountVectorizer queda totalmente definido por:
+- el vocabulario completo (sin podar) con la frecuencia de documento de cada término,
+- los conteos término-clase y la cantidad de documentos por clase.
+Todo eso es sumable, así que se puede guardar junto al modelo y, para reentrenar con
+unas pocas muestras nuevas, basta con contar solo esas muestras, sumar y volver a podar
+(min_df / max_df). El resultado es el mismo modelo que daría entrenar con todo el dataset.
+
+Los conteos se guardan como matriz sparse (n_clases, n_terminos) y el vocabulario no se
+mantiene ordenado: los términos nuevos se agregan al final. Así combinar no arma nada denso
+del tamaño del vocabulario ni reordena todo por un término nuevo; el orden alfabético que usa
+CountVectorizer se aplica recién al armar el modelo, sobre el vocabulario ya podado.
+"""
+
+import numpy as np
+import scipy.sparse as sp
+
+VERSION_ESTADISTICAS = 2   # 1: conteos densos y vocabulario ordenado (se siguen pudiendo combinar)
+
+
+def enteros_compactos(a):
+    """Conteos (vienen como float64 de MultinomialNB / del producto Y.T @ X) como int32 si son
+    enteros y entran; si no, se devuelven tal cual. No pierde nada. Acepta matrices sparse."""
+    if sp.issparse(a):
+        a = a.tocsr()
+        datos = enteros_compactos(a.data)
+        return sp.csr_matrix((datos, a.indices, a.indptr), shape=a.shape) if datos.dtype != a.dtype else a
+    a = np.asarray(a)
+    if a.size and np.issubdtype(a.dtype, np.floating) and not np.array_equal(a, np.floor(a)):
+        return a
+    if a.size and (a.min() < np.iinfo(np.int32).min or a.max() > np.iinfo(np.int32).max):
+        return a
+    return a.astype(np.int32)
+
+
+def _conteos_sparse(conteos):
+    # las estadísticas de la versión 1 tienen los conteos densos
+    return conteos.tocsr() if sp.issparse(conteos) else sp.csr_matrix(np.asarray(conteos))
+
+
+def calcular_estadisticas(X_limpio, y, ngram_range=(1, 2)):
+    """X_limpio: textos ya preprocesados (listas de stems o strings)."""
+    from sklearn.feature_extraction.text import CountVectorizer
+    from src.preprocess import AnalizadorTokens
+
+    vectorizador = CountVectorizer(analyzer=AnalizadorTokens(ngram_range=ngram_range))
+    X = vectorizador.fit_transform(X_limpio)
+    clases, y_idx = np.unique(np.asarray(y), return_inverse=True)
+    # indicadora documento-clase sparse: conteos = Y.T @ X sin pasar por denso
+    Y = sp.csr_matrix((np.ones(len(y_idx)), (y_idx, np.arange(len(y_idx)))), shape=(len(clases), len(y_idx)))
+    return {
+        "version": VERSION_ESTADISTICAS,
+        "ngram_range": tuple(ngram_range),
+        "terminos": vectorizador.get_feature_names_out().tolist(),
+        "doc_freq": enteros_compactos(np.bincount(X.indices, minlength=X.shape[1])),
+        "clases": clases,
+        "conteo_clases": np.bincount(y_idx, minlength=len(clases)).astype(np.float64),
+        "conteos": enteros_compactos(Y @ X),
+        "n_docs": X.shape[0],
+    }
+
+
+def combinar_estadisticas(a, b):
+    """Suma b a a (mismo ngram_range). Los términos de b que a no tenía se agregan al final del
+    vocabulario de a; solo se reubican los índices de b. Pensado para b chico (muestras nuevas)."""
+    if tuple(a["ngram_range"]) != tuple(b["ngram_range"]):
+        raise ValueError("No se pueden combinar estadísticas con distinto ngram_range")
+
+    # índice de cada término de b en el vocabulario de a (-1 = nuevo, va al final). El dict se arma
+    # solo con los términos que b usa: recorrer a es inevitable, pero no insertar todo su vocabulario
+    en_b = set(b["terminos"])
+    indice = {t: i for i, t in enumerate(a["terminos"]) if t in en_b}
+    cols_b = np.array([indice.get(t, -1) for t in b["terminos"]], dtype=np.int64)
+    nuevos = np.flatnonzero(cols_b < 0)
+    cols_b[nuevos] = len(a["terminos"]) + np.arange(len(nuevos))
+    terminos = list(a["terminos"]) + [b["terminos"][j] for j in nuevos]
+    n_terminos = len(terminos)
+
+    clases = np.union1d(a["clases"], b["clases"])
+    filas_a = np.searchsorted(clases, a["clases"])
+    filas_b = np.searchsorted(clases, b["clases"])
+
+    conteo_clases = np.zeros(len(clases), dtype=np.float64)
+    conteo_clases[filas_a] += a["conteo_clases"]
+    conteo_clases[filas_b] += b["conteo_clases"]
+
+    doc_freq = np.zeros(n_terminos, dtype=np.int64)
+    doc_freq[:len(a["doc_freq"])] = a["doc_freq"]
+    np.add.at(doc_freq, cols_b, b["doc_freq"])
+
+    # a: columnas vacías para los términos nuevos (y filas reubicadas si aparecieron clases nuevas)
+    conteos_a = _conteos_sparse(a["conteos"])
+    if len(clases) != len(a["clases"]):
+        ubicar = sp.csr_matrix((np.ones(len(filas_a)), (filas_a, np.arange(len(filas_a)))), shape=(len(clases), len(filas_a)))
+        conteos_a = ubicar @ conteos_a
+    conteos_a = sp.hstack([conteos_a, sp.csr_matrix((len(clases), len(nuevos)))], format="csr")
+    # b: solo se reubican sus índices
+    conteos_b = _conteos_sparse(b["conteos"]).tocoo()
+    conteos_b = sp.csr_matrix((conteos_b.data.astype(np.float64), (filas_b[conteos_b.row], cols_b[conteos_b.col])),
+                              shape=(len(clases), n_terminos))
+    conteos = conteos_a + conteos_b
+
+    return {
+        "version": VERSION_ESTADISTICAS,
+        "ngram_range": tuple(a["ngram_range"]),
+        "terminos": terminos,
+        "doc_freq": enteros_compactos(doc_freq),
+        "clases": clases,
+        "conteo_clases": conteo_clases,
+        "conteos": enteros_compactos(conteos),
+        "n_docs": a["n_docs"] + b["n_docs"],
+    }
+
+
+def modelo_desde_estadisticas(est, alpha=0.1, min_df=3, max_df=0.90, compacto=False):
+    """Pipeline ya entrenado (el mismo de construir_pipeline) a partir de las estadísticas."""
+    from src.pipeline import construir_pipeline, compactar_modelo, _mascara_vectorizador
+
+    terminos = np.asarray(est["terminos"], dtype=object)
+    orden_ngrama = np.array([t.count(" ") + 1 for t in est["terminos"]], dtype=np.int64)
+    config = {"vectorizador__min_df": min_df, "vectorizador__max_df": max_df,
+              "vectorizador__ngram_range": tuple(est["ngram_range"])}
+    mascara = _mascara_vectorizador(config, orden_ngrama, est["doc_freq"], est["n_docs"])
+    if mascara is None:
+        raise ValueError("Con ese min_df/max_df no queda ningún término en el vocabulario")
+
+    # el vocabulario podado en orden alfabético, como lo deja CountVectorizer
+    columnas = np.flatnonzero(mascara)
+    columnas = columnas[np.argsort(terminos[columnas], kind="stable")]
+
+    pipe = construir_pipeline(alpha=alpha, min_df=min_df, max_df=max_df, ngram_range=tuple(est["ngram_range"]), compacto=compacto)
+    vectorizador = pipe.named_steps["vectorizador"]
+    vectorizador.vocabulary_ = {t: i for i, t in enumerate(terminos[columnas])}
+    vectorizador.fixed_vocabulary_ = False
+
+    # mismos atributos y mismas cuentas que deja MultinomialNB.fit
+    clf = pipe.named_steps["clasificador"]
+    clf.classes_ = np.asarray(est["clases"])
+    clf.class_count_ = np.asarray(est["conteo_clases"], dtype=np.float64).copy()
+    # C-contiguo como el de fit: si no, las sumas por fila se acumulan en otro orden y
+    # feature_log_prob_ difiere en el último bit
+    clf.feature_count_ = np.ascontiguousarray(_conteos_sparse(est["conteos"])[:, columnas].toarray(), dtype=np.float64)
+    clf.n_features_in_ = len(columnas)
+    clf._update_feature_log_prob(clf._check_alpha())
+    clf._update_class_log_prior(class_prior=clf.class_prior)
+    return compactar_modelo(pipe) if compacto else pipe
+
+
+def config_del_pipeline(pipe):
+    """alpha, min_df, max_df y ngram_range de un pipeline entrenado (clásico o fusionado)."""
+    vectorizador = pipe.named_steps["vectorizador"]
+    analizador = vectorizador.analyzer
+    ngram_range = analizador.ngram_range if callable(analizador) else vectorizador.ngram_range
+    return {
+        "alpha": pipe.named_steps["clasificador"].alpha,
+        "min_df": vectorizador.min_df,
+        "max_df": vectorizador.max_df,
+        "ngram_range": tuple(ngram_range),
+        "compacto": es_compacto(pipe),
+    }
+
+
+def es_compacto(pipe):
+    return pipe.named_steps["clasificador"].feature_log_prob_.dtype == np.float32
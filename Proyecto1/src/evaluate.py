@@ -1,8 +1,7 @@
 import os
 from typing import Dict
 from src.train_utils import read_file, prepare_data
-from src.pipeline import cargar_modelo, predecir
-from sklearn.metrics import accuracy_score,f1_score,precision_score, recall_score
+from src.pipeline import cargar_modelo, predecir_evaluando
 
 
 PROJECT_ROOT = os.path.dirname(os.path.dirname(__file__))
@@ -14,21 +13,27 @@ DATA_TEST    = os.path.join(DATA_DIR, "test")
 
 
 # La idea es cargar un modelo .pkl con un archivo csv o excel. para evaluar métricas de rendimiento. 
-def evaluate_model_on_file(model_name,file_name,text_col, label_col):
-    # Manejar rutas con subcarpetas (ej: retrained/model_nb_2025-10-13.pkl)
-    if model_name.endswith('.pkl'):
+# usar_cache=True: el modelo sale del cache de modelos del proceso (lo usa la API)
+def evaluate_model_on_file(model_name,file_name,text_col, label_col, usar_cache=False):
+    from sklearn.metrics import accuracy_score,f1_score,precision_score, recall_score
+    # Manejar rutas con subcarpetas (ej: retrained/model_nb_2025-10-13.pkl) y carpetas .modelo
+    if model_name.endswith(('.pkl', '.modelo')):
         model_path = os.path.join(MODELS_DIR, model_name)
     else:
         model_path = os.path.join(MODELS_DIR, f"{model_name}.pkl")
     
-    bundle = cargar_modelo(model_path)
+    if usar_cache:
+        from src.cache_modelos import cargar_modelo_cacheado
+        bundle = cargar_modelo_cacheado(model_path)
+    else:
+        bundle = cargar_modelo(model_path)
     
     pipe = bundle["model"]
 
     file_path = os.path.join(DATA_TEST, file_name)
     df = read_file(file_path)
     X,y = prepare_data(df,text_col,label_col)
-    y_pred = predecir(pipe,X)
+    y_pred = predecir_evaluando(pipe,X)
 
 
     acc = accuracy_score(y, y_pred)
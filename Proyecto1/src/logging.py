@@ -6,7 +6,9 @@ BASE_DIR = os.path.dirname(os.path.dirname(__file__))  # raíz del proyecto
 LOG_DIR = os.path.join(BASE_DIR, "data", "logs")       # logs dentro de /data
 os.makedirs(LOG_DIR, exist_ok=True)
 
-def get_logger(name="app", level=logging.INFO):
+LOG_LEVEL = os.environ.get("ODS_LOG_LEVEL", "INFO").upper()  # DEBUG: incluye los bodies de cada request
+
+def get_logger(name="app", level=LOG_LEVEL):
     logger = logging.getLogger(name)
     if logger.handlers:  # evitar duplicados al recargar
         return logger
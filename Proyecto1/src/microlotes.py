@@ -0,0 +1,162 @@
+"""
+Micro-lotes para predicción concurrente.
+
+Cada request de /predict/async deja sus textos en una cola (asyncio) y espera un futuro.
+Un colector arma lotes con lo que haya en la cola y los puntúa en un pool de hilos, así el
+event loop nunca queda bloqueado con trabajo de CPU. Después reparte a cada request sus
+resultados.
+
+- Un lote se cierra al llegar a max_lote textos o cuando pasan max_espera_ms desde el
+  primero. Si no hay ningún lote en proceso no se espera: una request sola sale enseguida.
+- Con carga, mientras los workers están ocupados la cola se acumula y el siguiente lote sale
+  más grande: el costo fijo de cada llamada a sklearn se reparte entre muchos textos.
+- Las requests de un mismo lote pueden ser de distintos modelos: se agrupan por modelo (por el
+  hash de su contenido, si se pasa).
+- Cada grupo pasa por el cache de predicciones (src/cache_predicciones.py), igual que /predict/:
+  los textos repetidos del lote y los que ya están en el cache no se vuelven a puntuar.
+"""
+
+import os
+import time
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from src.logging import get_logger
+
+logger = get_logger("microlotes")
+
+MICROLOTE_MAX = int(os.environ.get("ODS_MICROLOTE_MAX", 64))
+MICROLOTE_ESPERA_MS = float(os.environ.get("ODS_MICROLOTE_ESPERA_MS", 5))
+MICROLOTE_WORKERS = int(os.environ.get("ODS_MICROLOTE_WORKERS", 1))
+
+
+class AgrupadorPredicciones:
+    def __init__(self, max_lote=MICROLOTE_MAX, max_espera_ms=MICROLOTE_ESPERA_MS, n_workers=MICROLOTE_WORKERS):
+        self.max_lote = max_lote
+        self.max_espera = max_espera_ms / 1000
+        self.n_workers = n_workers
+        self._cola = None
+        self._colector = None
+        self._pool = None
+        self._libres = None
+        self._en_proceso = 0
+        self.lotes = self.textos = self.requests = self.max_visto = 0
+
+    def _iniciar(self):
+        # se crea recién dentro del event loop que lo va a usar
+        self._cola = asyncio.Queue()
+        self._libres = asyncio.Semaphore(self.n_workers)
+        self._pool = ThreadPoolExecutor(max_workers=self.n_workers, thread_name_prefix="microlotes")
+        self._colector = asyncio.create_task(self._colectar())
+
+    async def predecir(self, pipe, textos, top_k=None, hash_modelo=None):
+        """Resultados de inferir(pipe, textos, top_k), puntuados junto con otras requests.
+        hash_modelo: hash del contenido del modelo (bundle['hash_contenido']), clave del cache de
+        predicciones; sin él se puntúa todo."""
+        if not textos:
+            return []
+        if self._colector is None:
+            self._iniciar()
+        futuro = asyncio.get_running_loop().create_future()
+        await self._cola.put(((pipe, hash_modelo), list(textos), top_k, futuro))
+        return await futuro
+
+    async def _colectar(self):
+        while True:
+            lote = [await self._cola.get()]
+            n_textos = len(lote[0][1])
+            limite = time.monotonic() + self.max_espera
+            while n_textos < self.max_lote:
+                if self._cola.empty():
+                    restante = limite - time.monotonic()
+                    if not self._en_proceso or restante <= 0:
+                        break   # nadie más esperando y un worker libre: no tiene sentido demorar
+                    try:
+                        item = await asyncio.wait_for(self._cola.get(), restante)
+                    except asyncio.TimeoutError:
+                        break
+                else:
+                    item = self._cola.get_nowait()
+                lote.append(item)
+                n_textos += len(item[1])
+            await self._libres.acquire()
+            # mientras se esperaba un worker libre pudieron llegar más: entran si hay lugar
+            while n_textos < self.max_lote and not self._cola.empty():
+                item = self._cola.get_nowait()
+                lote.append(item)
+                n_textos += len(item[1])
+            self._en_proceso += 1
+            asyncio.create_task(self._procesar(lote))
+
+    async def _procesar(self, lote):
+        try:
+            # un grupo por modelo: por su hash o, si no vino, por el objeto ya cargado
+            grupos = {}
+            for item in lote:
+                pipe, hash_modelo = item[0]
+                grupos.setdefault(hash_modelo or id(pipe), []).append(item)
+            loop = asyncio.get_running_loop()
+            for items in grupos.values():
+                await self._puntuar_grupo(loop, items)
+            self.lotes += 1
+            self.requests += len(lote)
+            n = sum(len(item[1]) for item in lote)
+            self.textos += n
+            self.max_visto = max(self.max_visto, n)
+        finally:
+            self._en_proceso -= 1
+            self._libres.release()
+
+    async def _puntuar_grupo(self, loop, items):
+        from src.cache_predicciones import CACHE_PREDICCIONES
+        pipe, hash_modelo = items[0][0]
+        todos = [t for item in items for t in item[1]]
+        pedidos = [item[2] for item in items if item[2]]
+        top_k = max(pedidos) if pedidos else None
+        try:
+            resultados = await loop.run_in_executor(self._pool, CACHE_PREDICCIONES.inferir, pipe, hash_modelo, todos, top_k)
+        except Exception as e:
+            logger.error(f"Falló un micro-lote de {len(todos)} textos: {e}")
+            for *_, futuro in items:
+                if not futuro.done():
+                    futuro.set_exception(e)
+            return
+        inicio = 0
+        for _, textos, k, futuro in items:
+            propios = resultados[inicio:inicio + len(textos)]
+            inicio += len(textos)
+            if top_k and k != top_k:
+                propios = [_recortar_top_k(r, k) for r in propios]
+            if not futuro.done():   # el cliente pudo haber cortado
+                futuro.set_result(propios)
+
+    def stats(self):
+        return {
+            "max_lote": self.max_lote,
+            "max_espera_ms": self.max_espera * 1000,
+            "n_workers": self.n_workers,
+            "lotes": self.lotes,
+            "requests": self.requests,
+            "textos": self.textos,
+            "textos_por_lote": round(self.textos / self.lotes, 2) if self.lotes else 0.0,
+            "lote_mas_grande": self.max_visto,
+            "en_cola": self._cola.qsize() if self._cola is not None else 0,
+        }
+
+    async def cerrar(self):
+        if self._colector is not None:
+            self._colector.cancel()
+            self._pool.shutdown(wait=False)
+            self._colector = None
+
+
+def _recortar_top_k(resultado, k):
+    resultado = dict(resultado)
+    if k:
+        resultado["top_k"] = resultado["top_k"][:k]
+    else:
+        resultado.pop("top_k", None)
+    return resultado
+
+
+AGRUPADOR = AgrupadorPredicciones()
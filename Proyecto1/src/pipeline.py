@@ -2,14 +2,11 @@ import os
 import sys
 sys.path.append(os.path.dirname(os.path.dirname(__file__)))
 import glob
-import joblib
-from sklearn.pipeline import Pipeline
-from sklearn.feature_extraction.text import CountVectorizer
-from sklearn.naive_bayes import MultinomialNB
-from src.preprocess import PreprocesadorTexto
-from sklearn.model_selection import GridSearchCV, StratifiedKFold
 from datetime import datetime
 
+# sklearn, joblib y el preprocesamiento (nltk) se importan dentro de cada función:
+# importar este módulo (y con él la API) tiene que ser barato. Ver reporte de arranque en api/app.py.
+
 
 
 # ----------------------------------------------------------------------
@@ -17,51 +14,485 @@ from datetime import datetime
 # ----------------------------------------------------------------------
 
 
-def construir_pipeline(alpha=0.1):
-    """Construye el pipeline completo: limpieza, vectorización , modelo"""
+def construir_pipeline(alpha=0.1, fusionado=True, min_df=3, max_df=0.90, ngram_range=(1,2), compacto=False):
+    """Construye el pipeline completo: limpieza, vectorización , modelo.
+    fusionado=True: el preprocesador entrega listas de stems y el AnalizadorTokens arma
+    los n-gramas sin volver a pasar por un string + regex (mismas features que el clásico).
+    compacto=True: el vectorizador cuenta en int32 en vez de int64 (ver compactar_modelo)."""
+    import numpy as np
+    from sklearn.pipeline import Pipeline
+    from sklearn.feature_extraction.text import CountVectorizer
+    from sklearn.naive_bayes import MultinomialNB
+    from src.preprocess import PreprocesadorTexto, AnalizadorTokens, TOKEN_PATTERN
+    if fusionado:
+        preprocesador = PreprocesadorTexto(salida="tokens")
+        vectorizador = CountVectorizer(analyzer=AnalizadorTokens(ngram_range=ngram_range), min_df=min_df, max_df=max_df)
+    else:
+        preprocesador = PreprocesadorTexto()
+        vectorizador = CountVectorizer(token_pattern=TOKEN_PATTERN, min_df=min_df, max_df=max_df, ngram_range=ngram_range)
+    if compacto:
+        vectorizador.set_params(dtype=np.int32)
     return Pipeline([
-        ("preprocesamiento", PreprocesadorTexto()), 
-        ("vectorizador", CountVectorizer(token_pattern=r"(?u)\b[a-z]{2,}\b", min_df=3, max_df=0.90, ngram_range=(1,2))),
+        ("preprocesamiento", preprocesador), 
+        ("vectorizador", vectorizador),
         ("clasificador", MultinomialNB(alpha=alpha)) 
     ])
 
+# Variante para entrenar por lotes (datasets que no entran en memoria): el HashingVectorizer
+# no aprende vocabulario, así que el espacio de features es fijo desde el principio y el
+# MultinomialNB se puede ir actualizando con partial_fit. Memoria: n_clases x n_features floats.
+N_FEATURES_HASHING = 2 ** 18
+
+def construir_pipeline_hashing(alpha=0.3, n_features=N_FEATURES_HASHING, ngram_range=(1,2), usar_cache=False):
+    from sklearn.pipeline import Pipeline
+    from sklearn.feature_extraction.text import HashingVectorizer
+    from sklearn.naive_bayes import MultinomialNB
+    from src.preprocess import PreprocesadorTexto, AnalizadorTokens
+    return Pipeline([
+        ("preprocesamiento", PreprocesadorTexto(salida="tokens", usar_cache=usar_cache)),
+        # conteos crudos (sin signo ni normalizar), que es lo que espera el NB multinomial
+        ("vectorizador", HashingVectorizer(analyzer=AnalizadorTokens(ngram_range=ngram_range), n_features=n_features,
+                                           alternate_sign=False, norm=None)),
+        ("clasificador", MultinomialNB(alpha=alpha)),
+    ])
+
+# Modo compacto: el MultinomialNB de sklearn siempre ajusta en float64, así que después del
+# fit se achican sus parámetros: feature_count_ a int32 (son conteos enteros, no se pierde
+# nada) y feature_log_prob_ a float32. El .pkl queda a la mitad y las matrices de conteo
+# del vectorizador (también en el CV) usan int32. Un modelo compacto no admite partial_fit.
+def compactar_modelo(pipe):
+    import numpy as np
+    from src.estadisticas import enteros_compactos
+    pipe.named_steps["vectorizador"].set_params(dtype=np.int32)
+    clf = pipe.named_steps["clasificador"]
+    clf.feature_count_ = enteros_compactos(clf.feature_count_)
+    clf.feature_log_prob_ = clf.feature_log_prob_.astype(np.float32)
+    return pipe
+
+# Ajusta vectorizador + clasificador sobre textos ya preprocesados (el preprocesador no aprende nada)
+def _ajustar_sobre_limpio(pipe, X_limpio, y):
+    for _, paso in pipe.steps[1:-1]:
+        X_limpio = paso.fit_transform(X_limpio, y)
+    pipe.steps[-1][1].fit(X_limpio, y)
+    return pipe
+
 
 # ----------------------------------------------------------------------
 # Funciones funcionales jajaj. (POSIBLE FUENTE DE ERRORES: GUARDAR EL MODELO Y VISUALIZARLO.)
 # Esto es una herrameinta para solo meterle datos y que entrene el modelo solito 
 # ----------------------------------------------------------------------
 
-def entrenar_modelo(X, y):
+ALPHAS = [0.05, 0.1, 0.3, 0.5, 1.0]
+# núcleos para el CV del entrenamiento (-1 = todos); se puede pisar en cada llamada
+N_JOBS_ENTRENAMIENTO = int(os.environ.get("ODS_TRAIN_N_JOBS", 1))
+
+def entrenar_modelo(X, y, precalcular=True, n_jobs=None, compacto=False):
+    """GridSearch de alpha con CV estratificado de 5 folds (f1_macro).
+    precalcular=True: como el grid solo mueve alpha, el preprocesamiento (que no aprende
+    nada) se hace una vez para todo el corpus y el vectorizador se ajusta una vez por fold;
+    para cada alpha solo se reentrena el MultinomialNB. Da el mismo modelo, params y score
+    que el GridSearchCV (que ajusta todo el pipeline 25 + 1 veces).
+    n_jobs: procesos para el CV (None = N_JOBS_ENTRENAMIENTO).
+    compacto: conteos int32 en el CV y modelo final compactado (compactar_modelo)."""
+    from sklearn.model_selection import GridSearchCV, StratifiedKFold
+    n_jobs = N_JOBS_ENTRENAMIENTO if n_jobs is None else n_jobs
+    pipe = construir_pipeline(compacto=compacto)
+    params = {"clasificador__alpha": ALPHAS,}
+    cv = StratifiedKFold(n_splits=5, shuffle=True, random_state=42)
+    if not precalcular:
+        # el cache de documentos solo mientras se entrena: el modelo guardado predice sin él
+        pipe.set_params(preprocesamiento__usar_cache=True)
+        gs = GridSearchCV(pipe, params, scoring="f1_macro", cv=cv, n_jobs=n_jobs, refit="f1_macro")
+        gs.fit(X, y)
+        pipe = gs.best_estimator_.set_params(preprocesamiento__usar_cache=False)
+        pipe = compactar_modelo(pipe) if compacto else pipe
+        return pipe, gs.best_params_, gs.best_score_
+
+    X_limpio = pipe.named_steps["preprocesamiento"].transform_cacheado(X)
+    scores = _scores_cv_precalculado(pipe, X_limpio, y, ALPHAS, cv, n_jobs=n_jobs)
+    medias = scores.mean(axis=1)
+    mejor = int(medias.argmax())  # primer máximo, igual que rank_test_score en GridSearchCV
+
+    pipe.set_params(clasificador__alpha=ALPHAS[mejor])
+    _ajustar_sobre_limpio(pipe, X_limpio, y)
+    if compacto:
+        compactar_modelo(pipe)
+    return pipe, {"clasificador__alpha": ALPHAS[mejor]}, float(medias[mejor])
+
+# scores[i, f] = f1_macro del alpha i en el fold f, vectorizando una sola vez por fold.
+# En paralelo va en dos fases sobre un pool de procesos:
+#   1) un job por fold ajusta el vectorizador y devuelve las matrices train/test;
+#   2) un job por (fold, alpha) ajusta el NB y calcula el score.
+# El corpus viaja como un buffer de bytes + offsets (arrays de numpy) y joblib los pasa a los
+# workers con memory mapping, igual que los arrays de las matrices sparse de la fase 2:
+# todos los workers leen las mismas páginas en vez de recibir una copia pickleada cada uno.
+def _scores_cv_precalculado(pipe, X_limpio, y, alphas, cv, n_jobs=1):
+    import numpy as np
+    y = np.asarray(y)
+    folds = list(cv.split(X_limpio, y))
+    vectorizador = pipe.named_steps["vectorizador"]
+    clasificador = pipe.named_steps["clasificador"]
+
+    if n_jobs == 1:
+        matrices = [_vectorizar_fold(vectorizador, [X_limpio[i] for i in train], [X_limpio[i] for i in test])
+                    for train, test in folds]
+        resultados = [_score_alpha(clasificador, alpha, X_train, y[train], X_test, y[test])
+                      for (X_train, X_test), (train, test) in zip(matrices, folds) for alpha in alphas]
+    else:
+        from joblib import Parallel, delayed, parallel_config
+        corpus, offsets = _empaquetar_corpus(X_limpio)
+        with parallel_config(backend="loky", n_jobs=n_jobs, max_nbytes="1M", mmap_mode="r"):
+            matrices = Parallel()(delayed(_vectorizar_fold_compartido)(vectorizador, corpus, offsets, train, test)
+                                  for train, test in folds)
+            resultados = Parallel()(delayed(_score_alpha)(clasificador, alpha, X_train, y[train], X_test, y[test])
+                                    for (X_train, X_test), (train, test) in zip(matrices, folds) for alpha in alphas)
+
+    # los resultados vienen fold por fold y dentro de cada fold alpha por alpha
+    return np.array(resultados).reshape(len(folds), len(alphas)).T
+
+def _vectorizar_fold(vectorizador, docs_train, docs_test):
+    from sklearn.base import clone
+    vectorizador = clone(vectorizador)
+    return vectorizador.fit_transform(docs_train), vectorizador.transform(docs_test)
+
+def _score_alpha(clasificador, alpha, X_train, y_train, X_test, y_test):
+    from sklearn.base import clone
+    from sklearn.metrics import f1_score
+    clf = clone(clasificador).set_params(alpha=alpha).fit(X_train, y_train)
+    return f1_score(y_test, clf.predict(X_test), average="macro")
+
+# ----------------------------------------------------------------------
+# Motor de CV cerrado para el alpha del MultinomialNB
+# El NB queda definido por los conteos token-clase del train. Con esos conteos por fold
+# se puede evaluar cualquier cantidad de alphas (p. ej. np.logspace(-3, 0, 200)) con álgebra
+# de numpy, sin reajustar nada: mismas fórmulas que MultinomialNB, mismos folds y mismo
+# f1_macro que el GridSearch, así que devuelve el mismo best_params_/best_score_.
+# ----------------------------------------------------------------------
+
+def entrenar_modelo_cerrado(X, y, alphas=None):
+    """Como entrenar_modelo, pero los alphas se evalúan en forma cerrada a partir de los conteos."""
+    import numpy as np
+    from sklearn.model_selection import StratifiedKFold
+    alphas = list(ALPHAS if alphas is None else alphas)
     pipe = construir_pipeline()
-    params = {"clasificador__alpha": [0.05, 0.1, 0.3, 0.5, 1.0],}
     cv = StratifiedKFold(n_splits=5, shuffle=True, random_state=42)
-    gs = GridSearchCV(pipe, params, scoring="f1_macro", cv=cv, n_jobs= 1, refit="f1_macro")
-    gs.fit(X, y)
-    return gs.best_estimator_, gs.best_params_, gs.best_score_
+
+    X_limpio = pipe.named_steps["preprocesamiento"].transform_cacheado(X)
+    y = np.asarray(y)
+    scores = np.empty((len(alphas), cv.get_n_splits()))
+    for f, (train, test) in enumerate(cv.split(X_limpio, y)):
+        X_train, X_test = _vectorizar_fold(pipe.named_steps["vectorizador"], [X_limpio[i] for i in train], [X_limpio[i] for i in test])
+        scores[:, f] = scores_alphas_cerrado(X_train, y[train], X_test, y[test], alphas)
+    medias = scores.mean(axis=1)
+    mejor = int(medias.argmax())
+
+    alpha = float(alphas[mejor])
+    pipe.set_params(clasificador__alpha=alpha)
+    _ajustar_sobre_limpio(pipe, X_limpio, y)
+    return pipe, {"clasificador__alpha": alpha}, float(medias[mejor])
+
+def conteos_por_clase(X_train, y_train):
+    """clases, conteo de documentos por clase y conteo token-clase (lo que guarda MultinomialNB)."""
+    import numpy as np
+    clases, y_idx = np.unique(y_train, return_inverse=True)
+    Y = np.zeros((len(y_idx), len(clases)), dtype=np.float64)
+    Y[np.arange(len(y_idx)), y_idx] = 1.0
+    return clases, Y.sum(axis=0), Y.T @ X_train
+
+def scores_alphas_cerrado(X_train, y_train, X_test, y_test, alphas):
+    """f1_macro en test para cada alpha, con un solo producto sparse x denso para todos."""
+    import numpy as np
+    clases, conteo_clases, conteo_features = conteos_por_clase(X_train, y_train)
+    # mismas cuentas que MultinomialNB._update_feature_log_prob / _update_class_log_prior
+    suavizado = conteo_features[None, :, :] + np.asarray(alphas, dtype=np.float64)[:, None, None]   # (A, K, F)
+    log_prob = np.log(suavizado) - np.log(suavizado.sum(axis=2))[:, :, None]
+    log_prior = np.log(conteo_clases) - np.log(conteo_clases.sum())
+
+    n_alphas, n_clases, n_features = log_prob.shape
+    jll = X_test @ log_prob.transpose(2, 0, 1).reshape(n_features, n_alphas * n_clases)
+    jll = np.asarray(jll).reshape(-1, n_alphas, n_clases) + log_prior
+    y_pred = clases[jll.argmax(axis=2)].T   # (A, n_test)
+    return f1_macro_por_fila(np.asarray(y_test), y_pred)
+
+def f1_macro_por_fila(y_true, y_pred):
+    """f1_score(y_true, y_pred[i], average="macro") para cada fila i, como lo calcula sklearn
+    (promedio sobre las etiquetas que aparecen en y_true o en esa fila de y_pred)."""
+    import numpy as np
+    etiquetas = np.unique(np.concatenate([y_true, y_pred.ravel()]))
+    t = np.searchsorted(etiquetas, y_true)
+    p = np.searchsorted(etiquetas, y_pred)
+    n_etq = len(etiquetas)
+    filas = np.arange(len(y_pred))[:, None]
+    true_sum = np.bincount(t, minlength=n_etq)
+    pred_sum = np.zeros((len(y_pred), n_etq), dtype=np.int64)
+    np.add.at(pred_sum, (filas, p), 1)
+    tp_sum = np.zeros_like(pred_sum)
+    np.add.at(tp_sum, (filas, p), (p == t[None, :]))
+    presentes = (true_sum[None, :] + pred_sum) > 0
+    with np.errstate(divide="ignore", invalid="ignore"):
+        f1 = 2.0 * tp_sum / (1.0 * true_sum[None, :] + pred_sum)
+    return np.array([f1[i, presentes[i]].mean() for i in range(len(y_pred))])
+
+# ----------------------------------------------------------------------
+# Entrenamiento map-reduce
+# Los conteos del NB son sumables: se parte el corpus en fragmentos de filas contiguas, cada
+# proceso preprocesa y cuenta el suyo (vocabulario sin podar + conteos por clase, ver
+# src/estadisticas.py) y después se suman en el orden de los fragmentos. La poda
+# min_df/max_df se hace sobre el total y el vocabulario podado se ordena al armar el modelo, así que es
+# exactamente el de construir_pipeline(alpha).fit(X, y) sin importar cuántos workers haya.
+# No hace CV: el alpha se pasa (0.3 es el que elige entrenar_modelo en los datos aumentados).
+# ----------------------------------------------------------------------
+
+def entrenar_modelo_mapreduce(X, y, alpha=0.3, n_workers=None, n_fragmentos=None, min_df=3, max_df=0.90, ngram_range=(1,2),
+                              compacto=False):
+    """Devuelve (pipe, params, estadisticas). n_workers: procesos (None = N_JOBS_ENTRENAMIENTO);
+    n_fragmentos: en cuántos pedazos se parte el corpus (por defecto uno por worker)."""
+    from joblib import Parallel, delayed, effective_n_jobs
+    from src.estadisticas import combinar_estadisticas, modelo_desde_estadisticas
+    if len(X) != len(y):
+        raise ValueError("X e y deben tener la misma longitud.")
+    n_workers = effective_n_jobs(N_JOBS_ENTRENAMIENTO if n_workers is None else n_workers)
+    n_fragmentos = max(1, min(n_fragmentos or n_workers, len(X)))
+    cortes = [len(X) * i // n_fragmentos for i in range(n_fragmentos + 1)]
+    fragmentos = [(X[a:b], y[a:b]) for a, b in zip(cortes, cortes[1:])]
+
+    if n_workers == 1:
+        parciales = [_estadisticas_fragmento(Xf, yf, ngram_range) for Xf, yf in fragmentos]
+    else:
+        parciales = Parallel(n_jobs=n_workers, backend="loky")(
+            delayed(_estadisticas_fragmento)(Xf, yf, ngram_range) for Xf, yf in fragmentos
+        )
+
+    est = parciales[0]
+    for parcial in parciales[1:]:
+        est = combinar_estadisticas(est, parcial)
+    pipe = modelo_desde_estadisticas(est, alpha=alpha, min_df=min_df, max_df=max_df, compacto=compacto)
+    return pipe, {"clasificador__alpha": alpha}, est
+
+# Fase "map": corre en cada worker
+def _estadisticas_fragmento(X, y, ngram_range):
+    from src.preprocess import PreprocesadorTexto
+    from src.estadisticas import calcular_estadisticas
+    return calcular_estadisticas(PreprocesadorTexto(salida="tokens").transform_cacheado(X), y, ngram_range)
+
+# ----------------------------------------------------------------------
+# Entrenamiento por lotes (out-of-core)
+# Recibe un iterable de lotes (X, y) y nunca tiene más de un lote en memoria.
+# Como no hay CV, el score es "prequential": cada lote se predice con el modelo entrenado
+# hasta el lote anterior y recién después se usa para entrenar (se acumula una matriz de
+# confusión, no las predicciones).
+# ----------------------------------------------------------------------
+
+def entrenar_modelo_por_lotes(lotes_xy, clases, alpha=0.3, n_features=N_FEATURES_HASHING, usar_cache=False):
+    import numpy as np
+    pipe = construir_pipeline_hashing(alpha=alpha, n_features=n_features)
+    preprocesador, vectorizador, clasificador = (paso for _, paso in pipe.steps)
+    preprocesar = preprocesador.transform_cacheado if usar_cache else preprocesador.transform
+    clases = np.unique(np.asarray(clases))
+    confusion = np.zeros((len(clases), len(clases)), dtype=np.int64)
+    n_muestras = n_lotes = 0
+
+    for X, y in lotes_xy:
+        if not len(y):
+            continue
+        y = np.asarray(y)
+        desconocidas = np.setdiff1d(y, clases)
+        if len(desconocidas):
+            raise ValueError(f"Etiquetas que no estaban en clases: {desconocidas.tolist()}")
+        X_vec = vectorizador.transform(preprocesar(X))
+        if n_lotes:
+            y_pred = clasificador.predict(X_vec)
+            np.add.at(confusion, (np.searchsorted(clases, y), np.searchsorted(clases, y_pred)), 1)
+        clasificador.partial_fit(X_vec, y, classes=clases)
+        n_muestras += len(y)
+        n_lotes += 1
+
+    if not n_lotes:
+        raise ValueError("El archivo no tiene filas para entrenar.")
+    return pipe, {"n_samples": n_muestras, "n_lotes": n_lotes, "f1_macro_prequential": f1_macro_confusion(confusion)}
+
+def f1_macro_confusion(confusion):
+    """f1 macro (como sklearn) a partir de la matriz de confusión; None si no hubo nada evaluado."""
+    import numpy as np
+    if not confusion.sum():
+        return None
+    tp = np.diag(confusion)
+    true_sum, pred_sum = confusion.sum(axis=1), confusion.sum(axis=0)
+    presentes = (true_sum + pred_sum) > 0
+    with np.errstate(divide="ignore", invalid="ignore"):
+        f1 = np.where(presentes, 2.0 * tp / (true_sum + pred_sum), 0.0)
+    return float(f1[presentes].mean())
+
+# ----------------------------------------------------------------------
+# Búsqueda ampliada: min_df, max_df y ngram_range además de alpha
+# Por fold se cuenta UNA vez la matriz completa de n-gramas (sin podar). Cada combinación
+# de min_df/max_df/ngram_range es solo una máscara de columnas sobre esa matriz (la misma
+# poda que hace CountVectorizer con las frecuencias de documento del train) y los alphas
+# se evalúan con el motor cerrado. Ningún texto se re-tokeniza ni se re-cuenta.
+# ----------------------------------------------------------------------
+
+GRID_VECTORIZADOR = {
+    "vectorizador__min_df": [1, 2, 3, 5],
+    "vectorizador__max_df": [0.8, 0.9, 1.0],
+    "vectorizador__ngram_range": [(1, 1), (1, 2), (2, 2)],
+}
+
+def buscar_hiperparametros(X, y, grid=None, alphas=None):
+    """Búsqueda en grilla de vectorizador + alpha. Devuelve (pipeline entrenado, best_params, best_score)
+    con best_params en el formato de GridSearchCV; el pipeline sale de construir_pipeline."""
+    import numpy as np
+    from sklearn.base import clone
+    from sklearn.model_selection import StratifiedKFold, ParameterGrid
+    from sklearn.feature_extraction.text import CountVectorizer
+    from src.preprocess import PreprocesadorTexto, AnalizadorTokens
+
+    grid = dict(GRID_VECTORIZADOR if grid is None else grid)
+    alphas = [float(a) for a in (ALPHAS if alphas is None else alphas)]
+    configs = list(ParameterGrid(grid))
+    max_n = max(rango[1] for rango in grid["vectorizador__ngram_range"])
+    cv = StratifiedKFold(n_splits=5, shuffle=True, random_state=42)
+
+    X_limpio = PreprocesadorTexto(salida="tokens").transform_cacheado(X)
+    y = np.asarray(y)
+    completo = CountVectorizer(analyzer=AnalizadorTokens(ngram_range=(1, max_n)), dtype=np.int32)
+    scores = np.full((len(configs), len(alphas), cv.get_n_splits()), np.nan)
+    for f, (train, test) in enumerate(cv.split(X_limpio, y)):
+        vectorizador = clone(completo)
+        X_train = vectorizador.fit_transform([X_limpio[i] for i in train]).tocsc()
+        X_test = vectorizador.transform([X_limpio[i] for i in test]).tocsc()
+        terminos = vectorizador.get_feature_names_out()
+        orden_ngrama = np.char.count(terminos.astype(str), " ") + 1
+        doc_freq = np.diff(X_train.indptr)   # en CSC = cantidad de documentos con el término
+        for c, config in enumerate(configs):
+            mascara = _mascara_vectorizador(config, orden_ngrama, doc_freq, X_train.shape[0])
+            if mascara is None:
+                continue   # CountVectorizer fallaría con esta combinación (sin términos o max_df < min_df)
+            scores[c, :, f] = scores_alphas_cerrado(X_train[:, mascara].tocsr(), y[train],
+                                                    X_test[:, mascara].tocsr(), y[test], alphas)
+
+    # mismo orden que ParameterGrid sobre todo el grid (incluido alpha) y primer máximo, como GridSearchCV
+    candidatos = [(a, c) for a in range(len(alphas)) for c in range(len(configs))]
+    medias = np.array([scores[c, a].mean() for a, c in candidatos])
+    a, c = candidatos[int(np.nanargmax(medias))]
+
+    best_params = {"clasificador__alpha": alphas[a], **configs[c]}
+    pipe = construir_pipeline(
+        alpha=alphas[a],
+        min_df=configs[c]["vectorizador__min_df"],
+        max_df=configs[c]["vectorizador__max_df"],
+        ngram_range=tuple(configs[c]["vectorizador__ngram_range"]),
+    )
+    _ajustar_sobre_limpio(pipe, X_limpio, y)
+    return pipe, best_params, float(np.nanmax(medias))
+
+def _mascara_vectorizador(config, orden_ngrama, doc_freq, n_docs):
+    """Columnas que dejaría un CountVectorizer con esa config (misma regla que _limit_features)."""
+    from numbers import Integral
+    min_df, max_df = config["vectorizador__min_df"], config["vectorizador__max_df"]
+    min_n, max_n = config["vectorizador__ngram_range"]
+    max_docs = max_df if isinstance(max_df, Integral) else max_df * n_docs
+    min_docs = min_df if isinstance(min_df, Integral) else min_df * n_docs
+    if max_docs < min_docs:
+        return None
+    mascara = (orden_ngrama >= min_n) & (orden_ngrama <= max_n) & (doc_freq <= max_docs) & (doc_freq >= min_docs)
+    return mascara if mascara.any() else None
+
+# Todo el corpus preprocesado en un solo buffer utf-8 + offsets (se puede mapear en memoria)
+def _empaquetar_corpus(X_limpio):
+    import numpy as np
+    docs = [(d if isinstance(d, str) else " ".join(d)).encode("utf-8") for d in X_limpio]
+    offsets = np.zeros(len(docs) + 1, dtype=np.int64)
+    np.cumsum([len(d) for d in docs], out=offsets[1:])
+    return np.frombuffer(b"".join(docs), dtype=np.uint8), offsets
+
+def _docs_compartidos(corpus, offsets, indices):
+    # el AnalizadorTokens y el CountVectorizer clásico aceptan el string con los stems
+    return [corpus[offsets[i]:offsets[i + 1]].tobytes().decode("utf-8") for i in indices]
+
+def _vectorizar_fold_compartido(vectorizador, corpus, offsets, train, test):
+    return _vectorizar_fold(vectorizador, _docs_compartidos(corpus, offsets, train), _docs_compartidos(corpus, offsets, test))
 
 
 # Permitirá hacer que nuestro modelo intente predecir
 def predecir(pipe, textos):
     return pipe.predict(textos)
 
+# predict para evaluar sobre un dataset: el preprocesamiento pasa por el cache de documentos
+# (los mismos textos de test se evalúan una y otra vez). Los .modelo no tienen ese paso.
+def predecir_evaluando(pipe, textos):
+    from src.preprocess import PreprocesadorTexto
+    pasos = getattr(pipe, "steps", None)
+    if not pasos or not isinstance(pasos[0][1], PreprocesadorTexto):
+        return pipe.predict(textos)
+    return pipe[1:].predict(pasos[0][1].transform_cacheado(textos))
+
 # Retornará la info de probabilidades con la que decidió
 def probabilidades(pipe, textos):
     return pipe.predict_proba(textos)
 
+# Una sola pasada: se calcula la matriz de probabilidades una vez y de ahí salen la
+# predicción, la confianza y (si se pide) las top_k clases con su probabilidad.
+# Sirve para el Pipeline, un .modelo o el MotorInferencia (todos tienen predict_proba y classes_).
+def inferir(pipe, textos, top_k=None):
+    import numpy as np
+    textos = list(textos)
+    if not textos:
+        return []
+    return armar_resultados(textos, np.asarray(pipe.predict_proba(textos)), pipe.classes_, top_k)
+
+# Resultados de inferir() a partir de la matriz de probabilidades ya calculada
+def armar_resultados(textos, proba, clases, top_k=None):
+    import numpy as np
+    clases = np.asarray(clases)
+    mejor = proba.argmax(axis=1)
+    if top_k:
+        # orden estable: con empate gana la clase que aparece primero, igual que argmax
+        orden = np.argsort(-proba, axis=1, kind="stable")[:, :top_k]
+    resultados = []
+    for i, texto in enumerate(textos):
+        r = {"texto": texto, "prediccion": clases[mejor[i]].item(), "confianza": float(proba[i, mejor[i]])}
+        if top_k:
+            r["top_k"] = [{"clase": clases[j].item(), "probabilidad": float(proba[i, j])} for j in orden[i]]
+        resultados.append(r)
+    return resultados
+
+# Versiones en streaming: toman un iterable de textos (puede venir de un archivo enorme)
+# y devuelven un resultado por lote, así en memoria solo hay un lote a la vez.
+def predecir_por_lotes(pipe, textos, tam_lote=None):
+    from src.preprocess import lotes, TAM_LOTE
+    for lote in lotes(textos, tam_lote or TAM_LOTE):
+        yield pipe.predict(lote)
+
+def probabilidades_por_lotes(pipe, textos, tam_lote=None):
+    from src.preprocess import lotes, TAM_LOTE
+    for lote in lotes(textos, tam_lote or TAM_LOTE):
+        yield pipe.predict_proba(lote)
+
 # Guarda el modelo para no tener que entrenarlo cada vez
-def guardar_modelo(pipe, ruta_base="models/model_nb", metadata: dict | None = None):
+# estadisticas: conteos del NB (ver src/estadisticas.py) para poder reentrenar incrementalmente
+def guardar_modelo(pipe, ruta_base="models/model_nb", metadata: dict | None = None, estadisticas: dict | None = None):
+    import joblib
     ts = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
     ruta = f"{ruta_base}_{ts}.pkl"
     os.makedirs(os.path.dirname(ruta_base), exist_ok=True)
     bundle = {"model": pipe, "metadata": metadata or {}}
+    if estadisticas is not None:
+        bundle["estadisticas"] = estadisticas
     joblib.dump(bundle, ruta)
+    # alta en models/registro.json (path, hash, params, score...) para listar sin abrir pickles
+    from src.registro import REGISTRO
+    REGISTRO.registrar(ruta, bundle["metadata"])
     print(f"-> Modelo guardado en: {ruta}")
     return ruta
 
 # muestra los modelos que hay guardados
 def listar_modelos(ruta_base="models/model_nb"):
-    """Lista todos los modelos guardados disponibles."""
-    modelos = sorted(glob.glob(f"{ruta_base}_*.pkl"))
+    """Lista todos los modelos guardados disponibles (.pkl y carpetas .modelo, ver src/artefacto.py).
+    Dentro de models/ se lee del registro (src/registro.py); fuera, se busca con glob."""
+    from src.registro import REGISTRO
+    modelos = REGISTRO.rutas(ruta_base)
+    if modelos is None:
+        modelos = sorted(glob.glob(f"{ruta_base}_*.pkl") + glob.glob(f"{ruta_base}_*.modelo"))
     if not modelos:
         print("-> No hay modelos guardados aún.")
     else:
@@ -71,21 +502,24 @@ def listar_modelos(ruta_base="models/model_nb"):
     return modelos
 
 def cargar_modelo(ruta="models/model_nb.pkl"):
+    from src.artefacto import es_artefacto, cargar_artefacto
+    if es_artefacto(ruta):
+        return cargar_artefacto(ruta)  # sin pickle: arrays con mmap
+    import joblib
     obj = joblib.load(ruta)
-    if isinstance(obj, dict) and "model" in obj:
-        return obj  # {'model': pipe, 'metadata': {...}}
-    # retrocompatibilidad: era solo el pipeline
-    return {"model": obj, "metadata": {}}
+    if not (isinstance(obj, dict) and "model" in obj):
+        obj = {"model": obj, "metadata": {}}  # retrocompatibilidad: era solo el pipeline
+    # los modelos guardados con usar_cache=True lo tenían prendido también para predecir
+    pasos = getattr(obj["model"], "steps", None)
+    if pasos and getattr(pasos[0][1], "usar_cache", False):
+        pasos[0][1].usar_cache = False
+    return obj  # {'model': pipe, 'metadata': {...}, 'estadisticas': {...} (si se guardaron)}
 
 # Devuelve etiquetas y nivel de confianza de forma legible.
 def visualizar_resultado(pipe, textos):
-   
-    y_pred = pipe.predict(textos)
-    probs = pipe.predict_proba(textos)
-    conf = probs.max(axis=1)
     return [
-        {"texto": t, "prediccion": int(lbl), "confianza": round(float(cf), 3)}
-        for t, lbl, cf in zip(textos, y_pred, conf)
+        {"texto": r["texto"], "prediccion": int(r["prediccion"]), "confianza": round(r["confianza"], 3)}
+        for r in inferir(pipe, textos)
     ]
 
 
@@ -15,19 +15,18 @@ Preprocesamiento de texto para ODS:
 
 import unicodedata as unicodedata
 import re
-import nltk 
-from nltk.corpus import stopwords
-from nltk.stem.snowball import SnowballStemmer
+import os
+import json
+import sqlite3
+import hashlib
+import threading
+from itertools import islice
 from sklearn.base import BaseEstimator, TransformerMixin
+from src.cache_documentos import CacheDocumentos, clave_texto
+from src.logging import get_logger
+from src.stopwords_es import STOPWORDS_ES  # lista de NLTK incluida en el paquete (sin nltk.download)
 
-try:
-    from nltk.corpus import stopwords
-    STOPWORDS_ES = set(stopwords.words("spanish"))
-except LookupError:
-    import nltk
-    nltk.download("stopwords")
-    from nltk.corpus import stopwords
-    STOPWORDS_ES = set(stopwords.words("spanish"))
+logger = get_logger("preprocess")
 
 # ----------------------------------------------------------------------
 # Funcioncitas atomizadas y lindas
@@ -58,17 +57,122 @@ def tokenizar(texto):
     return texto.split()
 
 # Elimina stopwords (NLTK español)
-STEMMER_ES = SnowballStemmer("spanish")
 def eliminar_stopwords(texto):
     nuevo_texto = [palabra for palabra in texto if palabra not in STOPWORDS_ES]
     return nuevo_texto
 
+# ----------------------------------------------------------------------
+# Cache de stems (token -> raíz)
+# El español repite muchísimo las mismas palabras, así que casi todo el trabajo del
+# Snowball se hace sobre tokens que ya vimos. Guardamos token -> stem en un dict acotado.
+# ----------------------------------------------------------------------
+
+STEM_CACHE_MAX = int(os.environ.get("ODS_STEM_CACHE_MAX", 200_000))
+STEM_CACHE_PATH = os.environ.get("ODS_STEM_CACHE_PATH")  # si existe, se carga al importar
+
+# NLTK tarda más de un segundo en importarse, así que el stemmer se crea recién
+# la primera vez que hace falta (STEMMER_ES sigue disponible, ver __getattr__ abajo)
+def crear_stemmer(idioma="spanish"):
+    from nltk.stem.snowball import SnowballStemmer
+    return SnowballStemmer(idioma)
+
+class CacheStems:
+    """Cache acotado token -> stem con contadores de aciertos y fallos.
+    Al llenarse se descartan las entradas más viejas (orden de inserción)."""
+
+    def __init__(self, stemmer=None, max_size=STEM_CACHE_MAX, idioma="spanish"):
+        self._stemmer = stemmer
+        self.max_size = max_size
+        self.idioma = idioma
+        self.hits = 0
+        self.misses = 0
+        self._stems = {}
+        self._lock = threading.Lock()  # solo se toma en los fallos (al escribir)
+
+    @property
+    def stemmer(self):
+        if self._stemmer is None:
+            self._stemmer = crear_stemmer(self.idioma)
+        return self._stemmer
+
+    def stem(self, token):
+        raiz = self._stems.get(token)
+        if raiz is not None:
+            self.hits += 1
+            return raiz
+        self.misses += 1
+        raiz = self.stemmer.stem(token)
+        with self._lock:
+            if len(self._stems) >= self.max_size:
+                self._stems.pop(next(iter(self._stems)))
+            self._stems[token] = raiz
+        return raiz
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "size": len(self._stems),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+        }
+
+    def limpiar(self):
+        with self._lock:
+            self._stems.clear()
+        self.hits = self.misses = 0
+
+    def guardar(self, ruta):
+        """Escribe el cache a disco en JSON (escritura atómica)."""
+        os.makedirs(os.path.dirname(os.path.abspath(ruta)), exist_ok=True)
+        with self._lock:
+            data = {"idioma": self.idioma, "stems": dict(self._stems)}
+        tmp = f"{ruta}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp, ruta)
+        return ruta
+
+    def cargar(self, ruta):
+        """Carga un cache guardado con `guardar`. Devuelve cuántas entradas se cargaron."""
+        with open(ruta, encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get("idioma") != self.idioma:
+            raise ValueError(f"El cache de stems es de otro idioma: {data.get('idioma')}")
+        stems = data.get("stems", {})
+        with self._lock:
+            for token, raiz in stems.items():
+                if len(self._stems) >= self.max_size:
+                    break
+                self._stems[token] = raiz
+        return len(stems)
+
+
+CACHE_STEMS = CacheStems()
+if STEM_CACHE_PATH and os.path.exists(STEM_CACHE_PATH):
+    CACHE_STEMS.cargar(STEM_CACHE_PATH)
+
+def __getattr__(nombre):
+    if nombre == "STEMMER_ES":
+        return CACHE_STEMS.stemmer
+    raise AttributeError(f"module {__name__!r} has no attribute {nombre!r}")
+
+def stats_cache_stems():
+    return CACHE_STEMS.stats()
+
+def guardar_cache_stems(ruta=None):
+    ruta = ruta or STEM_CACHE_PATH
+    if not ruta:
+        raise ValueError("No hay ruta para el cache de stems (define ODS_STEM_CACHE_PATH).")
+    return CACHE_STEMS.guardar(ruta)
+
 # Pasamos las palabras a su raíz
 # Función grande que hace todo el preprocesamiento
 # Usamos variables globales para eficiencia (no cargar siempre la info del stemmer y stopwords)
 
 def stemmear_texto(tokens):
-    lematizados = [STEMMER_ES.stem(token) for token in tokens]
+    lematizados = [CACHE_STEMS.stem(token) for token in tokens]
     return lematizados
 
 # Como los vectorizadores (Bow , TF-IDF etc.) de scikitlearn esperan una línea de texto string, toca unir los tokens limpios
@@ -76,23 +180,215 @@ def join_tokens(tokens):
     return " ".join(tokens)
 
 
+# ----------------------------------------------------------------------
+# Normalizador fusionado: lower + acentos + puntuación + split en una sola pasada
+# Cada carácter se traduce con una tabla (str.translate) en vez de crear cuatro strings
+# intermedios. La tabla se arma aplicando las funciones de arriba carácter por carácter,
+# así que por construcción da lo mismo que la cadena de etapas.
+# ----------------------------------------------------------------------
+
+def _normalizar_caracter(c):
+    return PUNCT.sub(" ", eliminar_acentos(eliminar_mayusculas(c)))
+
+class _TablaNormalizacion(dict):
+    """Tabla para str.translate que calcula (y recuerda) los caracteres no ASCII la primera vez que aparecen."""
+    def __missing__(self, codigo):
+        valor = self[codigo] = _normalizar_caracter(chr(codigo))
+        return valor
+
+TABLA_ASCII = {i: _normalizar_caracter(chr(i)) for i in range(128)}
+TABLA_NORMALIZACION = _TablaNormalizacion(TABLA_ASCII)
+
+def normalizar_tokens(texto):
+    """Equivale a tokenizar(limpiar_puntuacion(eliminar_acentos(eliminar_mayusculas(texto))))."""
+    if texto.isascii():
+        return texto.translate(TABLA_ASCII).split()
+    return texto.translate(TABLA_NORMALIZACION).split()
+
+
 # ----------------------------------------------------------------------
 # Función grande que hace todo el preprocesamiento
 # ----------------------------------------------------------------------
 
+# Núcleo: lista de stems. El modo fusionado se la pasa tal cual al AnalizadorTokens;
+# preprocesar_texto la une en un string para el CountVectorizer clásico.
+def preprocesar_tokens(texto):
+    stem = CACHE_STEMS.stem
+    return [stem(t) for t in normalizar_tokens(texto) if t not in STOPWORDS_ES]
+
 def preprocesar_texto(texto):
+    return join_tokens(preprocesar_tokens(texto))
+
+# Versión por etapas (la original). Se deja como referencia para verificar la paridad del normalizador.
+def preprocesar_texto_por_etapas(texto):
 
     texto = eliminar_mayusculas(texto)
     texto = eliminar_acentos(texto)
     texto = limpiar_puntuacion(texto)
     tokens = tokenizar(texto)
     tokens = [t for t in tokens if t not in STOPWORDS_ES]
-    tokens = [STEMMER_ES.stem(t) for t in tokens]
+    tokens = [CACHE_STEMS.stem(t) for t in tokens]
     return join_tokens(tokens)
 
-def preprocesar_varios(textos):
-    return [preprocesar_texto(t) for t in textos]
+# ----------------------------------------------------------------------
+# Cache en disco de documentos ya preprocesados
+# Entrenar (GridSearch), reentrenar y evaluar pasan una y otra vez por los mismos textos.
+# La firma cambia si cambia la configuración, así que nunca se sirve un resultado viejo.
+# Subir PREPROC_VERSION cada vez que cambie la salida de preprocesar_texto.
+# ----------------------------------------------------------------------
+
+PREPROC_VERSION = "1"
+FIRMA_PREPROC = hashlib.sha1(
+    f"{PREPROC_VERSION}|{CACHE_STEMS.idioma}|{'|'.join(sorted(STOPWORDS_ES))}".encode("utf-8")
+).hexdigest()[:16]
+
+_RUTA_CACHE_DEFECTO = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "cache", "preprocesados.sqlite")
+PREPROC_CACHE_PATH = os.environ.get("ODS_PREPROC_CACHE", _RUTA_CACHE_DEFECTO)  # "0" u "off" lo desactiva
+PREPROC_CACHE_MAX_MB = int(os.environ.get("ODS_PREPROC_CACHE_MAX_MB", 256))
+
+_cache_docs = None
+_cache_docs_lock = threading.Lock()
+
+def obtener_cache_documentos():
+    """Abre (una sola vez) el cache de documentos. Devuelve None si está desactivado o no se pudo abrir."""
+    global _cache_docs, PREPROC_CACHE_PATH
+    if _cache_docs is not None or PREPROC_CACHE_PATH.lower() in ("", "0", "off", "false"):
+        return _cache_docs
+    with _cache_docs_lock:
+        if _cache_docs is None:
+            try:
+                _cache_docs = CacheDocumentos(PREPROC_CACHE_PATH, FIRMA_PREPROC, max_bytes=PREPROC_CACHE_MAX_MB * 1024 * 1024)
+            except (sqlite3.Error, OSError) as e:
+                logger.warning(f"No se pudo abrir el cache de preprocesamiento ({e}); se sigue sin cache")
+                PREPROC_CACHE_PATH = "off"
+    return _cache_docs
 
+# ----------------------------------------------------------------------
+# Ejecución en paralelo por bloques
+# Con n_jobs != 1 los textos se parten en bloques de chunk_size y se reparten en un
+# pool de procesos (joblib/loky). Si caben en un solo bloque se quedan en el proceso
+# actual: arrancar el pool cuesta más que preprocesar un par de textos.
+# ----------------------------------------------------------------------
+
+CHUNK_SIZE = 1000
+
+def _preprocesar_lote(textos, tokens=False):
+    preprocesar = preprocesar_tokens if tokens else preprocesar_texto
+    return [preprocesar(t) for t in textos]
+
+def _preprocesar_en_bloques(textos, n_jobs=1, chunk_size=CHUNK_SIZE, tokens=False):
+    if n_jobs == 1 or len(textos) <= chunk_size:
+        return _preprocesar_lote(textos, tokens)
+    from joblib import Parallel, delayed
+    bloques = [textos[i:i + chunk_size] for i in range(0, len(textos), chunk_size)]
+    resultados = Parallel(n_jobs=n_jobs)(delayed(_preprocesar_lote)(b, tokens) for b in bloques)  # respeta el orden
+    return [limpio for bloque in resultados for limpio in bloque]
+
+# tokens=True devuelve listas de stems en vez de strings. El cache de documentos guarda
+# strings: con tokens=True lo que sale del cache se parte con split() y lo nuevo se une para guardarlo.
+def preprocesar_varios(textos, usar_cache=True, n_jobs=1, chunk_size=CHUNK_SIZE, tokens=False):
+    textos = list(textos)
+    cache = obtener_cache_documentos() if usar_cache else None
+    if cache is None:
+        return _preprocesar_en_bloques(textos, n_jobs, chunk_size, tokens)
+
+    claves = [clave_texto(t, cache.firma) for t in textos]
+    try:
+        encontrados = cache.obtener(claves)
+    except sqlite3.Error as e:
+        logger.warning(f"Cache de preprocesamiento no disponible ({e})")
+        return _preprocesar_en_bloques(textos, n_jobs, chunk_size, tokens)
+
+    # solo los que no están en el cache (y sin repetir) pasan por el preprocesamiento
+    pendientes = {}
+    for texto, clave in zip(textos, claves):
+        if clave not in encontrados and clave not in pendientes:
+            pendientes[clave] = texto
+    nuevos = dict(zip(pendientes, _preprocesar_en_bloques(list(pendientes.values()), n_jobs, chunk_size, tokens)))
+    if tokens:
+        encontrados = {clave: doc.split() for clave, doc in encontrados.items()}
+
+    resultado = [encontrados[clave] if clave in encontrados else nuevos[clave] for clave in claves]
+
+    try:
+        cache.guardar([(clave, join_tokens(doc) if tokens else doc) for clave, doc in nuevos.items()])
+    except sqlite3.Error as e:
+        logger.warning(f"No se pudo escribir en el cache de preprocesamiento ({e})")
+    return resultado
+
+
+# ----------------------------------------------------------------------
+# Versión en streaming: recibe cualquier iterable (incluso sin fin) y va
+# devolviendo lotes de tamaño acotado, sin tener todo en memoria.
+# ----------------------------------------------------------------------
+
+TAM_LOTE = 1000
+
+def lotes(iterable, tam_lote=TAM_LOTE):
+    """Parte un iterable en listas de a lo sumo tam_lote elementos."""
+    it = iter(iterable)
+    while True:
+        lote = list(islice(it, tam_lote))
+        if not lote:
+            return
+        yield lote
+
+def preprocesar_por_lotes(textos, tam_lote=TAM_LOTE, **kwargs):
+    """Generador: por cada lote de textos de entrada devuelve la lista de textos limpios."""
+    for lote in lotes(textos, tam_lote):
+        yield preprocesar_varios(lote, **kwargs)
+
+
+
+# ----------------------------------------------------------------------
+# Analizador fusionado para el CountVectorizer
+# El vectorizador clásico vuelve a unir los stems en un string, lo pasa a minúsculas y lo
+# re-tokeniza con token_pattern=r"(?u)\b[a-z]{2,}\b". Este analizador recibe la lista de
+# stems directamente, aplica el mismo filtro token por token y arma los n-gramas igual
+# que CountVectorizer._word_ngrams, así que las features salen idénticas.
+# ----------------------------------------------------------------------
+
+TOKEN_PATTERN = r"(?u)\b[a-z]{2,}\b"
+TOKEN_VALIDO = re.compile(TOKEN_PATTERN)
+
+def filtrar_tokens(tokens):
+    palabras = []
+    for t in tokens:
+        if t.isascii() and t.isalpha():  # caso típico: el token entero es la palabra
+            if len(t) >= 2:
+                palabras.append(t if t.islower() else t.lower())
+        else:
+            palabras.extend(TOKEN_VALIDO.findall(t.lower()))
+    return palabras
+
+class AnalizadorTokens:
+    """analyzer para CountVectorizer: lista de stems (o string con stems separados por espacio) -> n-gramas."""
+
+    def __init__(self, ngram_range=(1, 2)):
+        self.ngram_range = tuple(ngram_range)
+
+    def __call__(self, doc):
+        palabras = filtrar_tokens(doc.split() if isinstance(doc, str) else doc)
+        min_n, max_n = self.ngram_range
+        if max_n == 1:
+            return palabras
+        n_palabras = len(palabras)
+        features = list(palabras) if min_n == 1 else []
+        for n in range(max(min_n, 2), min(max_n + 1, n_palabras + 1)):
+            if n == 2:
+                features.extend([f"{a} {b}" for a, b in zip(palabras, palabras[1:])])
+            else:
+                features.extend(" ".join(palabras[i:i + n]) for i in range(n_palabras - n + 1))
+        return features
+
+    def __repr__(self):
+        return f"AnalizadorTokens(ngram_range={self.ngram_range})"
+
+    def __eq__(self, otro):
+        return isinstance(otro, AnalizadorTokens) and otro.ngram_range == self.ngram_range
+
+    def __hash__(self):
+        return hash(self.ngram_range)
 
 
 # ----------------------------------------------------------------------
@@ -101,6 +397,33 @@ def preprocesar_varios(textos):
 
 
 class PreprocesadorTexto(BaseEstimator, TransformerMixin):
+    # valores por defecto a nivel de clase: los pipelines viejos en models/ se
+    # deserializan sin estos atributos y así siguen funcionando.
+    # usar_cache=False: en inferencia (un texto por request) el cache en disco cuesta más de
+    # lo que ahorra; entrenar, reentrenar y evaluar lo usan con transform_cacheado()
+    usar_cache = False
+    n_jobs = 1
+    chunk_size = CHUNK_SIZE
+    salida = "texto"
+
+    def __init__(self, usar_cache=False, n_jobs=1, chunk_size=CHUNK_SIZE, salida="texto"):
+        """salida="texto" devuelve strings (para CountVectorizer con token_pattern);
+        salida="tokens" devuelve listas de stems para el AnalizadorTokens."""
+        self.usar_cache = usar_cache
+        self.n_jobs = n_jobs
+        self.chunk_size = chunk_size
+        self.salida = salida
+
     def fit(self, X, y=None): return self
-    def transform(self, X):   return [preprocesar_texto(t) for t in X]
+    def transform(self, X):
+        return self._transformar(X, self.usar_cache)
+
+    def transform_cacheado(self, X):
+        """transform() pasando siempre por el cache de documentos (entrenamiento y evaluación)."""
+        return self._transformar(X, True)
+
+    def _transformar(self, X, usar_cache):
+        # en modo tokens las listas de stems van directo al AnalizadorTokens, sin join + split
+        return preprocesar_varios(X, usar_cache=usar_cache, n_jobs=self.n_jobs, chunk_size=self.chunk_size,
+                                  tokens=self.salida == "tokens")
 
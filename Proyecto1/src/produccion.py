@@ -0,0 +1,171 @@
+"""
+Alias "producción": el modelo que usa /predict cuando no se pide uno en particular.
+
+- El alias vive en models/produccion.json ({"modelo": ruta relativa a models/, "promovido": fecha})
+  y se escribe de forma atómica (archivo temporal + os.replace).
+- La API lo precarga al arrancar; mientras no esté cargado, /health/ready responde 503.
+- promover() carga el modelo nuevo completo y recién ahí lo cambia (una sola asignación), así
+  las requests en curso siguen con el anterior y ninguna ve un modelo a medio cargar.
+- Cada worker revisa el mtime del alias: si otro worker promovió un modelo, lo carga y lo cambia.
+- Sin alias se usa el último models/model_nb_* y se revisa también el mtime de models/: un modelo
+  recién guardado (ej. POST /train/streaming) pasa a producción en la siguiente request de cada worker.
+"""
+
+import os
+import json
+import threading
+from datetime import datetime
+
+from src.logging import get_logger
+from src.cache_modelos import cargar_modelo_cacheado, huella_archivo
+
+logger = get_logger("produccion")
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(__file__))
+MODELS_DIR = os.path.join(PROJECT_ROOT, "models")
+ALIAS_PATH = os.environ.get("ODS_ALIAS_PRODUCCION", os.path.join(MODELS_DIR, "produccion.json"))
+
+
+class ModeloNoListo(RuntimeError):
+    pass
+
+
+def leer_alias(ruta_alias=ALIAS_PATH):
+    try:
+        with open(ruta_alias, encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def escribir_alias(modelo, ruta_alias=ALIAS_PATH):
+    alias = {"modelo": modelo, "promovido": datetime.now().isoformat(timespec="seconds")}
+    tmp = f"{ruta_alias}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(alias, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, ruta_alias)
+    return alias
+
+
+class ModeloProduccion:
+    def __init__(self, ruta_alias=ALIAS_PATH, models_dir=MODELS_DIR):
+        self.ruta_alias = ruta_alias
+        self.models_dir = models_dir
+        # (nombre, bundle, huella de la selección, cargado_en); se reemplaza entero, nunca se modifica
+        self._actual = None
+        self._error = None
+        self._fallo = None  # (modelo, huella) de la última carga fallida, para no reintentar en cada request
+        self._cargando = False
+        self._lock = threading.Lock()
+
+    def _huella_alias(self):
+        try:
+            return huella_archivo(self.ruta_alias)
+        except FileNotFoundError:
+            return None
+
+    def _huella_seleccion(self):
+        """Lo que decide qué modelo es el de producción: el alias y, sin alias, la carpeta models/
+        (un modelo nuevo pasa a ser el último)."""
+        huella = self._huella_alias()
+        if huella is not None:
+            return huella, None
+        try:
+            return None, os.stat(self.models_dir).st_mtime_ns
+        except FileNotFoundError:
+            return None, None
+
+    def _modelo_del_alias(self):
+        """Nombre (relativo a models/) que apunta el alias; sin alias, el último modelo guardado."""
+        alias = leer_alias(self.ruta_alias)
+        if alias:
+            return alias["modelo"]
+        from src.pipeline import listar_modelos
+        modelos = listar_modelos(os.path.join(self.models_dir, "model_nb"))
+        return os.path.relpath(modelos[-1], self.models_dir) if modelos else None
+
+    def _huella_fallo(self, seleccion, nombre):
+        """Lo que tiene que cambiar para que valga la pena reintentar una carga fallida: la selección
+        o el archivo del modelo elegido."""
+        try:
+            modelo = huella_archivo(os.path.join(self.models_dir, nombre)) if nombre else None
+        except FileNotFoundError:
+            modelo = None
+        return seleccion, modelo
+
+    def _falla_vigente(self, seleccion):
+        return self._fallo is not None and self._fallo[1] == self._huella_fallo(seleccion, self._fallo[0])
+
+    def _cargar(self, nombre, huella):
+        anterior = self._actual
+        bundle = cargar_modelo_cacheado(os.path.join(self.models_dir, nombre))
+        self._actual = (nombre, bundle, huella, datetime.now().isoformat(timespec="seconds"))
+        self._error = None
+        # sin alias cualquier cambio en models/ (ej. el registro) hace revisar: solo se loguea si cambió el modelo
+        if anterior is None or anterior[0] != nombre or anterior[1] is not bundle:
+            logger.info(f"Modelo de producción: {nombre}")
+
+    def cargar(self):
+        """Carga (o recarga) el modelo al que apunta el alias. Se llama al arrancar."""
+        with self._lock:
+            self._cargando = True
+            nombre = None
+            try:
+                huella = self._huella_seleccion()
+                nombre = self._modelo_del_alias()
+                if nombre is None:
+                    raise ModeloNoListo("No hay modelos guardados en models/")
+                self._cargar(nombre, huella)
+                self._fallo = None
+            except Exception as e:
+                self._error = str(e)
+                # sin modelos no se marca como fallido: en cuanto haya uno se reintenta
+                self._fallo = None if isinstance(e, ModeloNoListo) else (nombre, self._huella_fallo(huella, nombre))
+                logger.error(f"No se pudo cargar el modelo de producción: {e}")
+            finally:
+                self._cargando = False
+
+    def precargar_en_segundo_plano(self):
+        self._cargando = True
+        threading.Thread(target=self.cargar, name="precarga-produccion", daemon=True).start()
+
+    def obtener(self):
+        """(nombre, bundle) del modelo de producción. Si el alias cambió (otro worker promovió) o, sin
+        alias, se guardó un modelo nuevo, recarga."""
+        actual = self._actual
+        huella = self._huella_seleccion()
+        cambio = actual is not None and huella != actual[2]
+        sin_cargar = actual is None and not self._cargando
+        if (cambio or sin_cargar) and not self._falla_vigente(huella):
+            self.cargar()
+            actual = self._actual
+        if actual is None:
+            raise ModeloNoListo(self._error or "El modelo de producción todavía se está cargando")
+        return actual[0], actual[1]
+
+    def promover(self, nombre):
+        """Apunta el alias a otro modelo (ruta relativa a models/). Carga antes de cambiar."""
+        ruta = os.path.join(self.models_dir, nombre)
+        if not os.path.exists(ruta):
+            raise FileNotFoundError(f"Modelo no encontrado: {nombre}")
+        with self._lock:
+            bundle = cargar_modelo_cacheado(ruta)
+            escribir_alias(nombre, self.ruta_alias)
+            self._actual = (nombre, bundle, self._huella_seleccion(), datetime.now().isoformat(timespec="seconds"))
+            self._error = None
+        logger.info(f"Modelo promovido a producción: {nombre}")
+        return self.estado()
+
+    def estado(self):
+        actual = self._actual
+        return {
+            "listo": actual is not None,
+            "cargando": self._cargando,
+            "modelo": actual[0] if actual else None,
+            "cargado_en": actual[3] if actual else None,
+            "alias": leer_alias(self.ruta_alias),
+            "error": self._error,
+        }
+
+
+PRODUCCION = ModeloProduccion()
@@ -0,0 +1,340 @@
+"""
+Registro de modelos: models/registro.json con una entrada por modelo guardado.
+
+    {"version": 1, "modelos": {"retrained/model_nb_2025-10-13_10-00-00.pkl": {
+        "ruta", "formato" (pkl | modelo), "hash", "creado", "bytes", "params", "score", "f1_macro", "n_samples"}}}
+
+- guardar_modelo() y exportar_modelo() agregan la entrada apenas escriben el modelo. El archivo
+  se reescribe entero de forma atómica (temporal + os.replace), con un lock para que dos
+  procesos que guardan a la vez no se pisen.
+- Listar modelos lee este archivo (y lo deja en memoria mientras no cambie): no se recorre
+  la carpeta ni se abre ningún pickle, aunque models/retrained tenga miles de modelos.
+- Modelos que aparecen o desaparecen por fuera (copiados a mano, borrados, los del repo) se
+  detectan por el mtime de las carpetas: se sincroniza solo lo que cambió. Solo los modelos
+  nuevos se abren para leer su metadata. Las escrituras propias (registrar/quitar) dejan las
+  carpetas que tocaron como ya sincronizadas.
+- El primer llenado (abrir todos los pickles que todavía no están registrados) no se hace dentro
+  de un request: la API lo lanza en segundo plano al arrancar (sincronizar_en_segundo_plano) y,
+  mientras corre, las consultas devuelven lo que ya está en registro.json. En un deploy conviene
+  correr `python -m src.registro` antes de levantar la API.
+
+Uso (desde la carpeta Proyecto1):
+    python -m src.registro               # sincroniza el registro con lo que hay en models/
+    python -m src.registro --reconstruir # lo arma de cero
+"""
+
+import os
+import sys
+import json
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+
+try:
+    import fcntl   # lock entre procesos (no existe en Windows: ahí solo se usa el lock entre hilos)
+except ImportError:
+    fcntl = None
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from src.logging import get_logger
+
+logger = get_logger("registro")
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(__file__))
+MODELS_DIR = os.path.join(PROJECT_ROOT, "models")
+VERSION_REGISTRO = 1
+ORDENES = ("ruta", "creado", "f1_macro", "bytes")
+
+
+def _metadata_del_modelo(ruta):
+    from src.pipeline import cargar_modelo
+    try:
+        return cargar_modelo(ruta).get("metadata", {})
+    except Exception as e:
+        logger.warning(f"No se pudo leer la metadata de {ruta}: {e}")
+        return {}
+
+
+def entrada_registro(ruta, relativa, metadata=None, creado=None):
+    """Entrada del registro para un modelo ya escrito en disco."""
+    from src.cache_modelos import hash_contenido, huella_archivo
+    from src.artefacto import es_artefacto
+    metadata = metadata or {}
+    score = metadata.get("score") or {}
+    f1 = score.get("f1_macro_cv", score.get("f1_macro_prequential"))
+    n_samples = metadata.get("n_samples", metadata.get("n_total"))
+    return {
+        "ruta": relativa,
+        "formato": "modelo" if es_artefacto(ruta) else "pkl",
+        "hash": hash_contenido(ruta),
+        "creado": creado or datetime.now().isoformat(timespec="seconds"),
+        "bytes": huella_archivo(ruta)[1],
+        "params": metadata.get("params") or {},
+        "score": score,
+        "f1_macro": float(f1) if f1 is not None else None,
+        "n_samples": int(n_samples) if n_samples is not None else None,
+    }
+
+
+class RegistroModelos:
+    def __init__(self, models_dir=MODELS_DIR):
+        self.models_dir = os.path.abspath(models_dir)
+        self.ruta = os.path.join(self.models_dir, "registro.json")
+        self._leido = None        # (huella del registro, datos)
+        self._carpetas = None     # mtime de cada carpeta de models/ la última vez que se sincronizó
+        self._lock = threading.RLock()
+        self._lock_sincronizar = threading.RLock()   # una sincronización a la vez
+        self._sincronizando = threading.Event()      # mientras está puesto el registro puede estar incompleto
+
+    # ------------------------------------------------------------------
+    # Lectura y escritura
+    # ------------------------------------------------------------------
+
+    def _huella(self):
+        try:
+            st = os.stat(self.ruta)
+            return st.st_mtime_ns, st.st_size
+        except FileNotFoundError:
+            return None
+
+    def _leer_disco(self):
+        try:
+            with open(self.ruta, encoding="utf-8") as f:
+                datos = json.load(f)
+            if datos.get("version") == VERSION_REGISTRO:
+                return datos
+            logger.warning(f"Versión de registro no soportada ({datos.get('version')}): se reconstruye")
+        except FileNotFoundError:
+            pass
+        except ValueError as e:
+            logger.warning(f"Registro ilegible ({e}): se reconstruye")
+        return None
+
+    def _escribir(self, datos):
+        os.makedirs(self.models_dir, exist_ok=True)
+        tmp = f"{self.ruta}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(datos, f, ensure_ascii=False, indent=1)
+        os.replace(tmp, self.ruta)
+        self._leido = (self._huella(), datos)
+
+    @contextmanager
+    def _bloqueado(self):
+        with self._lock:
+            if fcntl is None:
+                yield
+                return
+            os.makedirs(self.models_dir, exist_ok=True)
+            with open(f"{self.ruta}.lock", "w") as lock:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _actualizar(self, cambio, carpeta=None):
+        """Lee el registro actual, le aplica cambio(modelos) y lo reescribe, todo con el lock tomado.
+        carpeta: la del modelo que se agregó o sacó, que queda al día junto con models/."""
+        with self._bloqueado():
+            datos = self._leer_disco() or {"version": VERSION_REGISTRO, "modelos": {}}
+            if cambio(datos["modelos"]) is not False:
+                self._escribir(datos)
+                self._marcar_sincronizadas(self.models_dir, carpeta)
+            return datos
+
+    def _marcar_sincronizadas(self, *carpetas):
+        """Después de una escritura propia: el mtime nuevo de esas carpetas ya está reflejado en el
+        registro, así que no hace falta volver a recorrerlas en la próxima consulta."""
+        if self._carpetas is None:
+            return
+        for carpeta in filter(None, carpetas):
+            try:
+                self._carpetas[carpeta] = os.stat(carpeta).st_mtime_ns
+            except FileNotFoundError:
+                self._carpetas.pop(carpeta, None)
+
+    def relativa(self, ruta):
+        """Ruta relativa a models/ (con /), o None si el modelo está fuera de models/."""
+        ruta = os.path.abspath(ruta).rstrip("/\\")
+        if os.path.commonpath([ruta, self.models_dir]) != self.models_dir:
+            return None
+        return os.path.relpath(ruta, self.models_dir).replace("\\", "/")
+
+    # ------------------------------------------------------------------
+    # Altas y sincronización
+    # ------------------------------------------------------------------
+
+    def registrar(self, ruta, metadata=None):
+        """Agrega (o reemplaza) la entrada de un modelo recién guardado. Ignora modelos fuera de models/."""
+        relativa = self.relativa(ruta)
+        if relativa is None:
+            return None
+        entrada = entrada_registro(ruta, relativa, metadata)
+        self._actualizar(lambda modelos: modelos.__setitem__(relativa, entrada), _carpeta_de(ruta))
+        return entrada
+
+    def quitar(self, ruta):
+        relativa = self.relativa(ruta)
+        self._actualizar(lambda modelos: modelos.pop(relativa, None) is not None, _carpeta_de(ruta))
+
+    def _recorrer(self):
+        """(modelos en disco, mtime de cada carpeta). Las carpetas .modelo son un modelo, no se recorren."""
+        encontrados, carpetas = [], {}
+        for raiz, dirs, archivos in os.walk(self.models_dir):
+            carpetas[raiz] = os.stat(raiz).st_mtime_ns
+            for d in [d for d in dirs if d.endswith(".modelo")]:
+                dirs.remove(d)
+                encontrados.append(os.path.join(raiz, d))
+            encontrados.extend(os.path.join(raiz, a) for a in archivos if a.endswith(".pkl"))
+        return {self.relativa(r): r for r in encontrados}, carpetas
+
+    def _carpetas_cambiaron(self):
+        if self._carpetas is None:
+            return True
+        for carpeta, mtime in self._carpetas.items():
+            try:
+                if os.stat(carpeta).st_mtime_ns != mtime:
+                    return True
+            except FileNotFoundError:
+                return True
+        return False
+
+    def sincronizar(self, reconstruir=False):
+        """Agrega los modelos que están en models/ y no en el registro, y saca los que ya no existen."""
+        with self._lock_sincronizar:
+            self._sincronizando.set()
+            try:
+                return self._sincronizar(reconstruir)
+            finally:
+                self._sincronizando.clear()
+
+    def _sincronizar(self, reconstruir):
+        en_disco, carpetas = self._recorrer()
+        previos = {} if reconstruir else (self._leer_disco() or {"modelos": {}})["modelos"]
+        # lo lento (abrir los pickles nuevos) va sin el lock del registro: mientras tanto se
+        # puede seguir leyendo y registrando modelos
+        nuevos = {}
+        for relativa in sorted(set(en_disco) - set(previos)):
+            ruta = en_disco[relativa]
+            creado = datetime.fromtimestamp(os.path.getmtime(ruta)).isoformat(timespec="seconds")
+            nuevos[relativa] = entrada_registro(ruta, relativa, _metadata_del_modelo(ruta), creado)
+
+        with self._bloqueado():
+            datos = None if reconstruir else self._leer_disco()
+            cambio = datos is None
+            datos = datos or {"version": VERSION_REGISTRO, "modelos": {}}
+            modelos = datos["modelos"]
+            # los registrados después del recorrido no están en en_disco pero sí existen
+            for relativa in [r for r in modelos if r not in en_disco
+                             and not os.path.exists(os.path.join(self.models_dir, r))]:
+                del modelos[relativa]
+                cambio = True
+            for relativa, entrada in nuevos.items():
+                if relativa not in modelos:
+                    modelos[relativa] = entrada
+                    cambio = True
+            if cambio:
+                self._escribir(datos)
+                logger.info(f"Registro de modelos sincronizado: {len(modelos)} modelos")
+                carpetas[self.models_dir] = os.stat(self.models_dir).st_mtime_ns   # escribir el registro cambia el mtime de models/
+            self._carpetas = carpetas
+            return datos
+
+    def sincronizar_en_segundo_plano(self):
+        """Para el arranque de la API: sincroniza en otro hilo. Mientras tanto leer() no sincroniza,
+        devuelve lo que ya está en registro.json."""
+        def correr():
+            try:
+                self.sincronizar()
+            except Exception as e:
+                logger.error(f"No se pudo sincronizar el registro de modelos: {e}")
+        self._sincronizando.set()   # desde ya, no cuando el hilo arranque
+        threading.Thread(target=correr, name="sincronizar-registro", daemon=True).start()
+
+    def leer(self):
+        """Datos del registro. Se relee solo si el archivo cambió; se sincroniza si cambió alguna carpeta
+        (salvo que ya haya una sincronización en curso: ahí se devuelve lo que hay)."""
+        if (not self._sincronizando.is_set() and self._carpetas_cambiaron()
+                and self._lock_sincronizar.acquire(blocking=False)):
+            try:
+                self.sincronizar()
+            finally:
+                self._lock_sincronizar.release()
+        with self._lock:
+            huella = self._huella()
+            if self._leido is None or self._leido[0] != huella:
+                self._leido = (huella, self._leer_disco() or {"version": VERSION_REGISTRO, "modelos": {}})
+            return self._leido[1]
+
+    # ------------------------------------------------------------------
+    # Consultas
+    # ------------------------------------------------------------------
+
+    def obtener(self, ruta):
+        relativa = self.relativa(ruta)
+        return self.leer()["modelos"].get(relativa) if relativa else None
+
+    def buscar(self, carpeta=None, formato=None, prefijo=None, min_f1=None, desde=None, hasta=None,
+               orden="ruta", descendente=False, offset=0, limite=None):
+        """Entradas filtradas y paginadas: {'total', 'offset', 'limite', 'modelos': [...]}.
+        carpeta: subcarpeta de models/ ('' = solo la raíz, ej. 'retrained'); desde/hasta: fechas ISO."""
+        if orden not in ORDENES:
+            raise ValueError(f"orden debe ser uno de {ORDENES}")
+        modelos = self.leer()["modelos"].values()
+        if carpeta is not None:
+            carpeta = carpeta.strip("/")
+            modelos = [m for m in modelos if os.path.dirname(m["ruta"]) == carpeta]
+        if formato:
+            modelos = [m for m in modelos if m["formato"] == formato]
+        if prefijo:
+            modelos = [m for m in modelos if os.path.basename(m["ruta"]).startswith(prefijo)]
+        if min_f1 is not None:
+            modelos = [m for m in modelos if m["f1_macro"] is not None and m["f1_macro"] >= min_f1]
+        if desde:
+            modelos = [m for m in modelos if m["creado"] >= desde]
+        if hasta:
+            modelos = [m for m in modelos if m["creado"] <= hasta]
+        # los que no tienen el valor (ej. sin score) van siempre al final
+        modelos = sorted(modelos, key=lambda m: m["ruta"])
+        con_valor = [m for m in modelos if m[orden] is not None]
+        sin_valor = [m for m in modelos if m[orden] is None]
+        modelos = sorted(con_valor, key=lambda m: m[orden], reverse=descendente) + sin_valor
+        fin = None if limite is None else offset + limite
+        return {"total": len(modelos), "offset": offset, "limite": limite, "modelos": modelos[offset:fin]}
+
+    def rutas(self, ruta_base):
+        """Lo mismo que glob(f'{ruta_base}_*.pkl') + glob(f'{ruta_base}_*.modelo'), pero desde el registro.
+        None si ruta_base está fuera de models/ o si hay una sincronización en curso (el registro
+        puede no tener todavía todos los modelos: ahí conviene el glob)."""
+        carpeta = self.relativa(os.path.dirname(os.path.abspath(ruta_base)))
+        if carpeta is None:
+            return None
+        self.leer()
+        if self._sincronizando.is_set():
+            return None
+        carpeta = "" if carpeta == "." else carpeta
+        prefijo = os.path.basename(ruta_base) + "_"
+        encontrados = self.buscar(carpeta=carpeta, prefijo=prefijo)["modelos"]
+        return sorted(os.path.join(os.path.dirname(ruta_base), os.path.basename(m["ruta"])) for m in encontrados)
+
+
+def _carpeta_de(ruta):
+    return os.path.dirname(os.path.abspath(ruta).rstrip("/\\"))
+
+
+REGISTRO = RegistroModelos()
+
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description="Sincroniza models/registro.json con los modelos guardados")
+    parser.add_argument("--reconstruir", action="store_true", help="arma el registro de cero")
+    args = parser.parse_args(argv)
+    datos = REGISTRO.sincronizar(reconstruir=args.reconstruir)
+    print(f"-> {len(datos['modelos'])} modelos en {REGISTRO.ruta}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
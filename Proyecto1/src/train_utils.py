@@ -1,7 +1,8 @@
 import os, shutil
-import pandas as pd
 from typing import List, Tuple, Optional, Dict
-from src.pipeline import entrenar_modelo, guardar_modelo
+from src.pipeline import entrenar_modelo, entrenar_modelo_mapreduce, guardar_modelo, cargar_modelo, entrenar_modelo_por_lotes, N_FEATURES_HASHING
+
+# pandas (y el preprocesamiento) se importan dentro de las funciones para que la API arranque rápido
 
 
 # ----------------------------------------------------------------------
@@ -10,6 +11,7 @@ from src.pipeline import entrenar_modelo, guardar_modelo
 
 # Transforma un excel o csv en un dataframe
 def read_file(path:str):
+    import pandas as pd
     ext = os.path.splitext(path)[1].lower()
     if ext in (".xlsx",".xls"):
         return pd.read_excel(path)
@@ -17,6 +19,45 @@ def read_file(path:str):
         return pd.read_csv(path)
     raise ValueError("Formato no soportado. Usa .csv o .xlsx")
 
+# Lee un archivo por pedazos de tam_lote filas (DataFrames), para no cargarlo entero.
+# CSV y Parquet se leen por bloques; los .xlsx fila a fila con openpyxl en modo solo lectura.
+def read_file_por_lotes(path: str, columnas: Optional[List[str]] = None, tam_lote: int = 10_000):
+    import pandas as pd
+    from src.preprocess import lotes
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".csv":
+        yield from pd.read_csv(path, usecols=columnas, chunksize=tam_lote)
+    elif ext == ".parquet":
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ValueError("Para leer .parquet hay que instalar pyarrow")
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=tam_lote, columns=columnas):
+            yield batch.to_pandas()
+    elif ext == ".xlsx":
+        from openpyxl import load_workbook
+        wb = load_workbook(path, read_only=True)
+        try:
+            filas = wb.active.iter_rows(values_only=True)
+            encabezado = [str(c) for c in next(filas, ())]
+            for bloque in lotes(filas, tam_lote):
+                df = pd.DataFrame(bloque, columns=encabezado)
+                yield df[columnas] if columnas else df
+        finally:
+            wb.close()
+    elif ext == ".xls":
+        # el formato viejo de Excel no se puede leer por partes
+        df = pd.read_excel(path, usecols=columnas)
+        for i in range(0, len(df), tam_lote):
+            yield df.iloc[i:i + tam_lote]
+    else:
+        raise ValueError("Formato no soportado. Usa .csv, .xlsx o .parquet")
+
+# Generador de listas de textos (una por lote) de la columna text_col
+def leer_textos_por_lotes(path: str, text_col: str, tam_lote: int = 10_000):
+    for df in read_file_por_lotes(path, [text_col], tam_lote):
+        yield df[text_col].fillna("").astype(str).tolist()
+
 # Agarra las columnas de interés texto y label de un dataset que puede ser grande 
 def prepare_data(df, text_col:str, label_col:str):
     if text_col not in df.columns or label_col not in df.columns:
@@ -31,30 +72,91 @@ def prepare_data(df, text_col:str, label_col:str):
 # ----------------------------------------------------------------------
 
 #Esto es para el entrenamiento inicial de un archivo.. desde 0. 
-def train_from_file(file_path: str, text_col: str, label_col: str):
+# backend="cv": elige alpha con CV (entrenar_modelo). backend="mapreduce": reparte el conteo
+# entre n_jobs procesos con el alpha dado (entrenar_modelo_mapreduce), sin score de CV.
+# compacto=True: conteos int32 y log-probabilidades float32 (ver compactar_modelo).
+def train_from_file(file_path: str, text_col: str, label_col: str, n_jobs: Optional[int] = None,
+                    backend: str = "cv", alpha: float = 0.3, compacto: bool = False):
     df = read_file(file_path)
     X, y = prepare_data(df, text_col, label_col)
-    pipe, best_params, best_score = entrenar_modelo(X, y)
+    if backend == "mapreduce":
+        pipe, best_params, estadisticas = entrenar_modelo_mapreduce(X, y, alpha=alpha, n_workers=n_jobs, compacto=compacto)
+        score = {}
+    elif backend == "cv":
+        pipe, best_params, best_score = entrenar_modelo(X, y, n_jobs=n_jobs, compacto=compacto)
+        estadisticas = estadisticas_del_modelo(pipe, X, y)
+        score = {"f1_macro_cv": float(best_score)}
+    else:
+        raise ValueError("backend debe ser 'cv' o 'mapreduce'")
     
     # metadatos para el dump y referencia del modelo
     meta = {
         "dataset_path": file_path,
         "text_col": text_col,
         "label_col": label_col,
+        "backend": backend,
+        "compacto": compacto,
         "n_samples": len(y),
         "params": best_params,
-        "score": {"f1_macro_cv": float(best_score)},
+        "score": score,
     }
 
+    ruta = guardar_modelo(pipe, metadata=meta, estadisticas=estadisticas)
+    print(f"-> Modelo guardado en: {ruta}")
+    return ruta, meta
+
+
+# Entrenamiento para archivos que no entran en memoria: se lee por lotes (CSV/Parquet/xlsx),
+# se preprocesa cada lote y se actualiza el NB con partial_fit. La memoria depende de tam_lote
+# y n_features, no de la cantidad de filas. Si no se pasan las clases se hace una primera
+# pasada leyendo solo la columna de labels.
+def train_streaming_from_file(file_path: str, text_col: str, label_col: str, clases: Optional[List] = None,
+                              alpha: float = 0.3, n_features: int = N_FEATURES_HASHING, tam_lote: int = 10_000,
+                              usar_cache: bool = False):
+    if clases is None:
+        clases = set()
+        for df in read_file_por_lotes(file_path, [label_col], tam_lote):
+            clases.update(df[label_col].dropna().tolist())
+        clases = sorted(clases)
+
+    def lotes_xy():
+        for df in read_file_por_lotes(file_path, [text_col, label_col], tam_lote):
+            yield prepare_data(df, text_col, label_col)
+
+    pipe, resumen = entrenar_modelo_por_lotes(lotes_xy(), clases, alpha=alpha, n_features=n_features, usar_cache=usar_cache)
+    meta = {
+        "dataset_path": file_path,
+        "text_col": text_col,
+        "label_col": label_col,
+        "modo": "streaming",
+        "n_samples": resumen["n_samples"],
+        "n_lotes": resumen["n_lotes"],
+        "n_features": n_features,
+        "params": {"clasificador__alpha": alpha},
+        "score": {"f1_macro_prequential": resumen["f1_macro_prequential"]},
+    }
     ruta = guardar_modelo(pipe, metadata=meta)
     print(f"-> Modelo guardado en: {ruta}")
     return ruta, meta
 
 
+# Conteos del NB sobre todo el dataset de entrenamiento, para reentrenar después sin releerlo.
+# El preprocesamiento sale del cache de documentos (se acaba de hacer para entrenar).
+def estadisticas_del_modelo(pipe, X, y):
+    from src.estadisticas import calcular_estadisticas, config_del_pipeline
+    X_limpio = pipe.named_steps["preprocesamiento"].transform_cacheado(X)
+    return calcular_estadisticas(X_limpio, y, config_del_pipeline(pipe)["ngram_range"])
+
+
 # Esto te permite subir un par de textos para re-entrenar el modelo. 
-def retrain_with_samples(base_file_path,text_col,label_col,nuevos_textos,nuevos_labels):
+# Si se pasa modelo_base (un .pkl con estadísticas) el reentrenamiento es incremental.
+def retrain_with_samples(base_file_path,text_col,label_col,nuevos_textos,nuevos_labels,n_jobs=None,modelo_base=None):
     if len(nuevos_labels)!= len(nuevos_textos):
         raise ValueError("textos y labels deben tener la misma longitud.")
+    if modelo_base:
+        return retrain_incremental(modelo_base, nuevos_textos, nuevos_labels)
+    if not (base_file_path and text_col and label_col):
+        raise ValueError("Para reentrenar completo hacen falta base_file_path, text_col y label_col.")
     
     df_base = read_file(base_file_path)
     X_base,Y_base = prepare_data(df_base,text_col,label_col)
@@ -62,11 +164,53 @@ def retrain_with_samples(base_file_path,text_col,label_col,nuevos_textos,nuevos_
     X = X_base + list(map(str, nuevos_textos))
     Y = Y_base + list(nuevos_labels)
 
-    pipe, best_params, best_score = entrenar_modelo(X, Y)
+    pipe, best_params, best_score = entrenar_modelo(X, Y, n_jobs=n_jobs)
     meta = { "dataset_base": base_file_path,"text_col": text_col,"label_col": label_col,"n_base": len(Y_base),"n_new": len(nuevos_labels),"n_total": len(Y), "params": best_params,"score": {"f1_macro_cv": float(best_score)}}
-    ruta = guardar_modelo(pipe,ruta_base="models/retrained/model_nb",metadata = meta)
+    ruta = guardar_modelo(pipe,ruta_base="models/retrained/model_nb",metadata = meta, estadisticas=estadisticas_del_modelo(pipe, X, Y))
     return ruta,meta
 
+# Reentrenamiento incremental: solo se preprocesan y cuentan las muestras nuevas; se suman a las
+# estadísticas guardadas en el modelo base y se arma el modelo nuevo con los mismos hiperparámetros.
+# El tiempo depende de cuántas muestras nuevas hay, no del tamaño del dataset base.
+def retrain_incremental(modelo_base, nuevos_textos, nuevos_labels):
+    from src.estadisticas import calcular_estadisticas, combinar_estadisticas, modelo_desde_estadisticas, config_del_pipeline
+    if len(nuevos_labels)!= len(nuevos_textos):
+        raise ValueError("textos y labels deben tener la misma longitud.")
+    if not nuevos_textos:
+        raise ValueError("No hay muestras nuevas para reentrenar.")
+
+    ruta_base = modelo_base if os.path.exists(modelo_base) else os.path.join("models", modelo_base)
+    bundle = cargar_modelo(ruta_base)
+    est_base = bundle.get("estadisticas")
+    if est_base is None:
+        raise ValueError("El modelo base no tiene estadísticas guardadas: hay que reentrenarlo completo una vez.")
+
+    config = config_del_pipeline(bundle["model"])
+    X_nuevo = bundle["model"].named_steps["preprocesamiento"].transform_cacheado(list(map(str, nuevos_textos)))
+    est = combinar_estadisticas(est_base, calcular_estadisticas(X_nuevo, list(nuevos_labels), est_base["ngram_range"]))
+    # el modelo nuevo sale compacto si el base lo era
+    pipe = modelo_desde_estadisticas(est, alpha=config["alpha"], min_df=config["min_df"], max_df=config["max_df"],
+                                     compacto=config["compacto"])
+
+    meta_base = bundle.get("metadata", {})
+    meta = {
+        "modo": "incremental",
+        "modelo_base": ruta_base,
+        "dataset_base": meta_base.get("dataset_base", meta_base.get("dataset_path")),
+        "text_col": meta_base.get("text_col"),
+        "label_col": meta_base.get("label_col"),
+        "n_base": int(est_base["n_docs"]),
+        "n_new": len(nuevos_labels),
+        "n_total": int(est["n_docs"]),
+        "params": {"clasificador__alpha": config["alpha"]},
+        # no se corre CV: el modelo nuevo no tiene score propio. El del base queda aparte
+        # para que el registro (f1_macro, min_f1) no se lo atribuya al modelo nuevo
+        "score": {},
+        "score_modelo_base": meta_base.get("score", {}),
+    }
+    ruta = guardar_modelo(pipe, ruta_base="models/retrained/model_nb", metadata=meta, estadisticas=est)
+    return ruta, meta
+
 # Esto te permite cargar un CSV o un excel para re-entrenar los modelos
 def retrain_with_file():
     return 0
\ No newline at end of file